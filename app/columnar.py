@@ -0,0 +1,272 @@
+import glob
+import hashlib
+import logging
+import os
+
+import pandas as pd
+
+from app.config import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Without pyarrow every stage reads the CSV directly
+    pa = pq = None
+
+COLUMNAR_AVAILABLE = pq is not None
+
+_BOOLEANS = {"True": True, "False": False, "TRUE": True, "FALSE": False, "true": True, "false": False}
+_LEADING_ZERO = r"^\s*[+-]?0\d"
+_PLAIN_INTEGER = r"-?\d+"
+
+
+def _fingerprint(csv_path):
+    """Identifies one version of a file by its path, size and modification time."""
+    stat = os.stat(csv_path)
+    payload = f"{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_prefix(csv_path, cache_dir=None):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir or Config.UPLOAD_CACHE_FOLDER, name)
+
+
+def cache_path(csv_path, cache_dir=None):
+    """Path of the columnar cache of the current version of a CSV file."""
+    return f"{_cache_prefix(csv_path, cache_dir)}.{_fingerprint(csv_path)}.parquet"
+
+
+def find_cache(csv_path, cache_dir=None):
+    """
+    Returns the columnar cache of a CSV file, or None if it has not been
+    converted or has changed since.
+    """
+    if pq is None or not os.path.exists(csv_path):
+        return None
+    path = cache_path(csv_path, cache_dir)
+    return path if os.path.exists(path) else None
+
+
+def _parse_column(text, dtype=None):
+    """
+    Types one column of raw CSV text like `pd.read_csv` would, with two
+    differences: numbers whose text would change (e.g. ZIP codes with leading
+    zeros) stay text, and integers with missing values become `Int64` rather
+    than floats. Integer and text columns therefore keep the exact CSV text.
+
+    Args:
+        text (pd.Series): Column read with `dtype=str`.
+        dtype (str, optional): "float64" or "str", forced after the column
+            changed type between chunks.
+    """
+    if dtype == "str":
+        return text
+    if dtype is not None:
+        return pd.to_numeric(text).astype(dtype)  # Raises ValueError if the column no longer fits
+    present = text.dropna()
+    if not present.empty and present.isin(list(_BOOLEANS)).all():
+        values = text.map(_BOOLEANS)
+        return values.astype(bool) if len(present) == len(text) else values.astype(object)
+    if present.str.contains(_LEADING_ZERO).any():
+        return text
+    try:
+        numbers = pd.to_numeric(text)
+    except (ValueError, TypeError):
+        return text
+    if present.str.fullmatch(_PLAIN_INTEGER).all():
+        try:
+            return numbers if numbers.dtype.kind in "iu" else numbers.astype("Int64")
+        except (TypeError, ValueError, OverflowError):
+            return text  # Too large for 64 bits
+    if numbers.dtype.kind in "iu":
+        return text  # Integers written differently, e.g. "+5"
+    return numbers
+
+
+def _widen(first, other):
+    """Picks the dtype for a column parsed as `first` in one chunk and `other` in another."""
+    numeric = pd.api.types.is_numeric_dtype
+    boolean = pd.api.types.is_bool_dtype
+    if numeric(first) and numeric(other) and not boolean(first) and not boolean(other):
+        return "float64"
+    return "str"
+
+
+def _write_parquet(csv_path, target, chunksize, dtypes):
+    """
+    Writes the CSV to Parquet, one row group per chunk.
+
+    Returns:
+        dict: Columns whose dtype changed between chunks, with the dtype to
+        parse them as on the next attempt. Empty if the file was written.
+    """
+    writer = None
+    try:
+        with pd.read_csv(csv_path, chunksize=chunksize, dtype=str) as reader:
+            for text in reader:
+                chunk = pd.DataFrame(
+                    {column: _parse_column(text[column], dtypes.get(column)) for column in text.columns},
+                    index=text.index,
+                )
+                chunk_schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    first_dtypes, schema = chunk.dtypes, chunk_schema
+                    writer = pq.ParquetWriter(target, schema)
+                else:
+                    conflicts = {
+                        field.name: _widen(first_dtypes[field.name], chunk[field.name].dtype)
+                        for field in chunk_schema
+                        if not field.type.equals(schema.field(field.name).type)
+                    }
+                    if conflicts:
+                        return conflicts
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        if writer is None:
+            # Header only
+            pq.write_table(pa.Table.from_pandas(pd.read_csv(csv_path, nrows=0), preserve_index=False), target)
+    except ValueError:
+        # A widened column holds a value its new dtype cannot parse
+        escalated = {column: "str" for column, dtype in dtypes.items() if dtype == "float64"}
+        if not escalated:
+            raise
+        return escalated
+    finally:
+        if writer is not None:
+            writer.close()
+    return {}
+
+
+def convert_csv(csv_path, cache_dir=None, chunksize=100000, max_attempts=5):
+    """
+    Converts a CSV file once into a Parquet file that later stages read instead
+    of parsing the CSV again.
+
+    The CSV is streamed, so memory is bounded by `chunksize`. Columns are typed
+    as `pd.read_csv` would type them (see `_parse_column` for the exceptions).
+    A column whose type differs between chunks (e.g. integers in one chunk and
+    decimals in a later one) is widened and the conversion restarts. The cache file name includes a fingerprint of
+    the CSV, so a changed file is never answered from an outdated cache;
+    caches of earlier versions are removed.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        cache_dir (str, optional): Directory of the cache files; defaults to
+            `Config.UPLOAD_CACHE_FOLDER`.
+        chunksize (int): Rows per chunk and per Parquet row group.
+        max_attempts (int): Restarts allowed for widening column types.
+
+    Returns:
+        str: Path of the Parquet file.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required to convert uploads to Parquet.")
+    target = cache_path(csv_path, cache_dir)
+    if os.path.exists(target):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    dtypes = {}
+    try:
+        for _ in range(max_attempts):
+            conflicts = _write_parquet(csv_path, tmp_path, chunksize, dtypes)
+            if not conflicts:
+                break
+            logging.info(f"Column types changed between chunks of {csv_path}; converting again with {conflicts}.")
+            dtypes.update(conflicts)
+        else:
+            raise ValueError(f"Column types of {csv_path} did not settle after {max_attempts} attempts.")
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    for stale in glob.glob(f"{glob.escape(_cache_prefix(csv_path, cache_dir))}.*.parquet"):
+        if stale != target:
+            os.remove(stale)
+    logging.info(f"Converted {csv_path} to {target}.")
+    return target
+
+
+def cache_columns(path):
+    """
+    Returns the columns of a cache file and whether each one keeps the exact
+    CSV text: text columns, and integers (whose text was checked to round-trip
+    on conversion). Only the file footer is read.
+    """
+    schema = pq.read_schema(path, memory_map=True)
+    return {
+        field.name: pa.types.is_string(field.type) or pa.types.is_large_string(field.type)
+        or pa.types.is_integer(field.type)
+        for field in schema
+    }
+
+
+def _types_mapper(string_dtype, nullable_integers):
+    mapping = {}
+    if string_dtype is not None:
+        string_dtype = pd.api.types.pandas_dtype(string_dtype)
+        mapping.update({pa.string(): string_dtype, pa.large_string(): string_dtype})
+    if nullable_integers:
+        mapping[pa.int64()] = pd.Int64Dtype()
+    return mapping.get if mapping else None
+
+
+def row_group_rows(path):
+    """Returns the number of rows of each row group of a cache file. Only the file footer is read."""
+    metadata = pq.read_metadata(path, memory_map=True)
+    return [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+
+
+def read_cache(path, columns=None, string_dtype=None, nullable_integers=False, row_groups=None):
+    """
+    Reads a memory-mapped cache file, or only the given `row_groups` of it; see
+    `iter_cache` for the other arguments.
+    """
+    if row_groups is None:
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pq.ParquetFile(path, memory_map=True).read_row_groups(row_groups, columns=columns)
+    return table.to_pandas(types_mapper=_types_mapper(string_dtype, nullable_integers), ignore_metadata=True)
+
+
+def iter_cache(path, chunksize, columns=None, string_dtype=None, nullable_integers=False):
+    """
+    Yields DataFrames of at most `chunksize` rows from a memory-mapped cache file.
+
+    Args:
+        path (str): Cache file returned by `convert_csv` or `find_cache`.
+        chunksize (int): Rows per chunk.
+        columns (list, optional): Only read these columns.
+        string_dtype (str, optional): Dtype of text columns, e.g.
+            "string[pyarrow]"; by default they come out as `pd.read_csv` returns them.
+        nullable_integers (bool): Return integer columns as `Int64`; by default
+            integer columns with missing values come out as floats, as with
+            `pd.read_csv`.
+
+    Yields:
+        pd.DataFrame: Chunks with a running index, as with `pd.read_csv(chunksize=...)`.
+    """
+    start = 0
+    parquet = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+        chunk = batch.to_pandas(types_mapper=_types_mapper(string_dtype, nullable_integers), ignore_metadata=True)
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def read_parsed_chunks(csv_path, chunksize):
+    """
+    Yields chunks of a CSV file typed the way its columnar cache types them,
+    so codes with leading zeros stay text; read from that cache when there is
+    one. Unlike in the cache, a column may change dtype between chunks.
+    """
+    cache = find_cache(csv_path)
+    if cache is not None:
+        yield from iter_cache(cache, chunksize)
+        return
+    with pd.read_csv(csv_path, chunksize=chunksize, dtype=str) as reader:
+        for text in reader:
+            yield pd.DataFrame({column: _parse_column(text[column]) for column in text.columns}, index=text.index)
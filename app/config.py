@@ -2,12 +2,42 @@ import os
 
 class Config:
     BASE_DIR = os.path.abspath(os.getcwd())  # Base directory
-    TABLE_NAME = "harmonized_data"
+    TABLE_NAME = os.getenv("TABLE_NAME")  # Destination table of every load; by default each file gets its own
     SECRET_KEY = os.getenv("SECRET_KEY", "dev_secret_key")
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+    UPLOAD_CACHE_FOLDER = os.path.join(BASE_DIR, "uploads_cache")  # Parquet copies of the uploaded CSV files
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))  # Bytes read at a time from an upload
+    UPLOAD_SNIFF_BYTES = 64 * 1024  # Bytes of an upload used to detect its delimiter
     SCHEMA_FILE = os.path.join(BASE_DIR, "etl_info", "schema.json")
     API_KEY_FILE = os.path.join(BASE_DIR, "etl_info", "api_key.txt")
+    SCHEMA_CACHE_DIR = os.path.join(BASE_DIR, "etl_info", "schema_cache")
+    SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", 7 * 24 * 3600))  # Seconds
+    SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", 256))
+    LOCAL_SCHEMA_TYPES = os.getenv("LOCAL_SCHEMA_TYPES", "1") == "1"  # Type columns the profile settles without the LLM
+    PROFILE_MAX_ROWS = int(os.getenv("PROFILE_MAX_ROWS", 1000000))  # Rows profiled for schema inference; 0 for all
+    SESSION_DB = os.path.join(BASE_DIR, "etl_info", "sessions.sqlite3")  # Dashboard sessions and schema versions
+    SESSION_TTL = int(os.getenv("SESSION_TTL", 30 * 24 * 3600))  # Seconds after its last change a session is kept
+    SCHEMA_MAX_VERSIONS = 50  # Schema versions kept per session
+    JOBS_DB = os.path.join(BASE_DIR, "etl_info", "jobs.sqlite3")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", os.cpu_count() or 1))  # Processes running ETL/inference jobs
+    METRICS_DB = os.path.join(BASE_DIR, "etl_info", "metrics.sqlite3")
+    METRICS_REPORT_DIR = os.path.join(BASE_DIR, "etl_info", "runs")  # One JSON report per pipeline run
+    METRICS_TTL = int(os.getenv("METRICS_TTL", 30 * 24 * 3600))  # Seconds run metrics and reports are kept
+    METRICS_MAX_RUNS = int(os.getenv("METRICS_MAX_RUNS", 1000))  # Runs kept in the metrics table and report folder
+    METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 24 * 3600))  # Seconds of runs aggregated by /metrics
+    QUARANTINE_DIR = os.path.join(BASE_DIR, "etl_info", "quarantine")  # Rows rejected by validation, one CSV per run
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 2))  # Connections kept open per destination and process
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 3))  # Extra connections per destination and process
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Seconds before a connection is reopened
+    LOAD_STREAMS = int(os.getenv("LOAD_STREAMS", 4))  # Connections COPYing into a replaced table in parallel
     LOG_FILE = os.path.join(BASE_DIR, "etl_info", "app_log.log")
+    LOG_MAX_BYTES = 100000  # Size at which the log file is rotated
+    LOG_BACKUP_COUNT = 10  # Rotated log files kept
+    LOG_STREAM_INTERVAL = 1.0  # Seconds between checks for new lines in /logs/stream
+    LOG_STREAM_MAX_SECONDS = int(os.getenv("LOG_STREAM_MAX_SECONDS", 300))  # Seconds before /logs/stream closes and the browser reconnects
+    TRANSFORM_CHUNKSIZE = int(os.getenv("TRANSFORM_CHUNKSIZE", 100000))  # Rows per chunk when streaming uploads
+    TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", 1))  # Processes per ETL job casting partitions of a file
 
     @staticmethod
     def init_app(app):
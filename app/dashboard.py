@@ -1,21 +1,84 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, send_file
 import os
-import pandas as pd
-from app.transform import transform_data, load_data_to_postgres
-from app.llm_utils import infer_schema_logic
-from openai import OpenAI
+from importlib.util import find_spec
 from app.config import Config
 from app.logging_config import configure_logging
+from app.schema_cache import SchemaCache
+from app.jobs import JobManager, SUCCEEDED, FAILED, CANCELLED
+from app.metrics import MetricsStore
+from app.log_reader import LogReader, level_number
+from app.db import destination_uri, engines
+from app.upload import receive_upload, InvalidUpload
+from app.session_store import SessionStore, SQLiteSessionInterface
+from werkzeug.utils import secure_filename
+import atexit
 import json
+import threading
+import time
+
+# pandas, SQLAlchemy and the OpenAI SDK are imported by the routes and jobs
+# that use them, so starting the dashboard does not pay for them
+COLUMNAR_AVAILABLE = find_spec("pyarrow") is not None  # As in app.columnar, without importing pyarrow
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 configure_logging(app)
+schema_cache = SchemaCache(
+    app.config["SCHEMA_CACHE_DIR"],
+    ttl=app.config["SCHEMA_CACHE_TTL"],
+    max_entries=app.config["SCHEMA_CACHE_MAX_ENTRIES"],
+)
+metrics_store = MetricsStore(
+    app.config["METRICS_DB"], app.config["METRICS_REPORT_DIR"],
+    app.config["METRICS_TTL"], app.config["METRICS_MAX_RUNS"], app.config["METRICS_WINDOW"]
+)
+log_reader = LogReader(app.config["LOG_FILE"], backup_count=app.config["LOG_BACKUP_COUNT"])
+session_store = SessionStore(
+    app.config["SESSION_DB"], ttl=app.config["SESSION_TTL"], max_versions=app.config["SCHEMA_MAX_VERSIONS"]
+)
+# Session values live in SQLite; the cookie only carries the session ID
+app.session_interface = SQLiteSessionInterface(session_store)
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """
+    Returns the job manager, starting it on first use. Worker processes and the
+    debug reloader import this module too; they must not start a second pool
+    that resumes the same jobs.
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager(
+                app.config["JOBS_DB"], max_workers=app.config["JOB_WORKERS"], logger=app.logger,
+                secret_key=app.config["SECRET_KEY"],
+            )
+            atexit.register(_job_manager.shutdown)
+    return _job_manager
 
 @app.before_request
 def clear_flash_messages():
-    session.pop('_flashes', None)
+    if "_flashes" in session:  # Only touch the session (and the store) when there is something to clear
+        session.pop("_flashes")
+
+
+def current_schema():
+    """
+    Returns the schema mapping of the session's current version, or None. Only
+    the routes that need the schema load it from the session store.
+    """
+    entry = session_store.get_schema(session.sid, session.get("schema_version"))
+    return entry["mapping"] if entry else None
+
+
+def save_schema(schema_mapping, source):
+    """Stores a schema as the session's new current version and writes it to the schema file."""
+    session["schema_version"] = session_store.save_schema(session.sid, schema_mapping, source)
+    with open(app.config["SCHEMA_FILE"], "w") as f:
+        json.dump(schema_mapping, f, indent=4)
 
 def load_api_key():
     """Load the API key from a file during app startup."""
@@ -34,14 +97,8 @@ def load_api_key():
 
 @app.route("/")
 def index():
-    """Dashboard home page."""
-    log_file = app.config["LOG_FILE"]
-    try:
-        with open(log_file, "r") as f:
-            logs = f.read().replace("\n", "<br>")
-    except FileNotFoundError:
-        logs = "No logs available."
-    return render_template("index.html", logs=logs)
+    """Dashboard home page. Logs are fetched by the page from `/logs` and `/logs/stream`."""
+    return render_template("index.html")
 
 @app.route("/save_api_key", methods=["POST"])
 def save_api_key():
@@ -91,6 +148,9 @@ def set_destination_db():
         if not all([db_host, db_name, db_user, db_password]):
             flash("All fields are required to set the destination database.")
             return redirect(request.url)
+        if not str(db_port).isdigit():
+            flash("The database port must be a number.")
+            return redirect(request.url)
 
         # Save the destination DB connection details in the session
         session["destination_db"] = {
@@ -102,6 +162,9 @@ def set_destination_db():
         }
 
         app.logger.info("Database connection info saved.")
+        health = engines.check(destination_uri(session["destination_db"]))
+        if not health["ok"]:
+            flash(f"Saved, but the destination database is not reachable: {health['error']}")
         return redirect(url_for("index"))
 
     return render_template("set_destination_db.html")
@@ -124,16 +187,39 @@ def upload_file():
         # Saving the file
         upload_folder = app.config["UPLOAD_FOLDER"]
         os.makedirs(upload_folder, exist_ok=True)
-        file_path = os.path.join(upload_folder, file.filename)
+        file_path = os.path.join(upload_folder, secure_filename(file.filename))
         try:
-            file.save(file_path)
+            # Streams the file to disk, validating it before any later stage sees it
+            info = receive_upload(
+                file.stream, file_path,
+                chunk_size=app.config["UPLOAD_CHUNK_SIZE"], sniff_bytes=app.config["UPLOAD_SNIFF_BYTES"],
+            )
+        except InvalidUpload as e:
+            app.logger.warning(f"Rejected upload '{file.filename}': {e}")
+            flash(f"Invalid CSV file: {e}")
+            return render_template("upload.html")
         except Exception as e:
             flash(f"Error saving file: {e}")
             return render_template("upload.html")
         
         session["uploaded_file_path"] = file_path
-        file_size = os.path.getsize(file_path)
-        app.logger.info(f"File '{file.filename}' uploaded successfully, size: {file_size} bytes")
+        app.logger.info(
+            f"File '{file.filename}' uploaded successfully, size: {info['bytes']} bytes, "
+            f"{info['rows']} rows, {info['columns']} columns"
+        )
+        if info["short_rows"]:
+            app.logger.warning(
+                f"Rows of '{file.filename}' have fewer fields than the header (e.g. lines {info['short_rows']}); "
+                "their missing fields are read as empty."
+            )
+        if info["invalid_utf8_offset"] is not None:
+            app.logger.warning(
+                f"'{file.filename}' is not valid UTF-8 (invalid byte at offset {info['invalid_utf8_offset']}) "
+                f"and was read as {info['encoding']}."
+            )
+        if COLUMNAR_AVAILABLE:
+            # Later stages read the columnar copy instead of parsing the CSV again
+            get_job_manager().submit("convert", csv_file_path=file_path, chunksize=app.config["TRANSFORM_CHUNKSIZE"])
         return redirect(url_for("index"))
     return render_template("upload.html")
 
@@ -145,51 +231,217 @@ def infer_schema():
         return redirect(url_for("index"))
     
     app.logger.info(f"Starting Inferring Schema for: {csv_file_path} ...")
-    schema_file = app.config["SCHEMA_FILE"]
     try:
-        api_key = session.get("openai_api_key")
-        if not api_key:
-            raise ValueError("API key is missing. Please input it via the dashboard.")
- 
-        client = OpenAI(api_key=api_key)
-        model = session.get("selected_model", "gpt-3.5-turbo")
-        app.logger.info(f"Using model: {model}")
-        schema_mapping = infer_schema_logic(csv_file_path, client, model=model) 
-        session["schema_mapping"] = schema_mapping 
-        with open(schema_file, "w") as f:
-            json.dump(schema_mapping, f, indent=4)
-        app.logger.info("Schema inferred and saved successfully.")
-        return redirect(url_for("schema"))
+        job_id = submit_inference(csv_file_path, session.get("sample_rows", 5))
+        flash(f"Schema inference started (job {job_id}). The schema page shows it once finished.")
     
     except Exception as e:
         app.logger.error(f"Failed to infer schema: {e}")
         flash(f"Schema inference failed: {e}")
+    return redirect(url_for("index"))
 
-        # Fallback: Load the last saved schema if available
-        if os.path.exists(schema_file):
-            try:
-                with open(schema_file, "r") as f:
-                    session["schema_mapping"] = json.load(f)
-                app.logger.info("Loaded the last saved schema as a fallback.")
-                flash("Using the last saved schema as a fallback.")
-            except Exception as fallback_error:
-                app.logger.error(f"Fallback schema loading failed: {fallback_error}")
-                flash("No valid schema available. Please retry after fixing the error.")
-        return redirect(url_for("index"))
+def submit_inference(csv_file_path, sample_rows, proposal=False):
+    """
+    Queues an inference job for the session's file; `collect_inferred_schema`
+    picks up its result. A `proposal` is only offered for review in the Edit
+    Schema box instead of becoming the current schema.
+    """
+    api_key = session.get("openai_api_key")
+    if not api_key:
+        raise ValueError("API key is missing. Please input it via the dashboard.")
+
+    model = session.get("selected_model", "gpt-3.5-turbo")
+    app.logger.info(f"Using model: {model}")
+    job_id = get_job_manager().submit(
+        "infer_schema",
+        csv_file_path=csv_file_path,
+        api_key=api_key,
+        model=model,
+        sample_rows=sample_rows,
+        local_types=app.config["LOCAL_SCHEMA_TYPES"],
+        profile_rows=app.config["PROFILE_MAX_ROWS"] or None,
+        cache_config={
+            "cache_dir": app.config["SCHEMA_CACHE_DIR"],
+            "ttl": app.config["SCHEMA_CACHE_TTL"],
+            "max_entries": app.config["SCHEMA_CACHE_MAX_ENTRIES"],
+        },
+    )
+    session["infer_job_id"] = job_id
+    session["infer_job_proposal"] = proposal
+    return job_id
+
+def collect_inferred_schema():
+    """
+    Moves the result of a finished inference job into the session and schema
+    file, or, for a proposal, stores it as a version kept under
+    `proposed_schema_version` until the user saves the Edit Schema box.
+    """
+    job_id = session.get("infer_job_id")
+    if not job_id:
+        return
+    job = get_job_manager().get(job_id)
+    if job is None or job["status"] not in (SUCCEEDED, FAILED, CANCELLED):
+        flash("Schema inference is still running. Refresh the page to see the result.")
+        return
+    session.pop("infer_job_id")
+    proposal = session.pop("infer_job_proposal", False)
+    if job["status"] == SUCCEEDED and proposal:
+        session["proposed_schema_version"] = session_store.save_schema(session.sid, job["result"], "proposed")
+        flash("The re-inferred schema is shown in Edit Schema. Review it and click Update Schema to use it.")
+        app.logger.info("Schema re-inferred and proposed for review.")
+    elif job["status"] == SUCCEEDED:
+        save_schema(job["result"], "inferred")
+        session.pop("proposed_schema_version", None)
+        app.logger.info("Schema inferred and saved successfully.")
+    else:
+        flash(f"Schema inference {job['status']}: {job['error'] or job['message']}")
+
+@app.route("/jobs")
+def list_jobs():
+    """Recent ETL and schema inference jobs."""
+    return jsonify(get_job_manager().list())
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Status and progress of a single job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    if not get_job_manager().cancel(job_id):
+        return jsonify({"error": "Job not found or already finished."}), 404
+    return jsonify(get_job_manager().get(job_id))
+
+@app.route("/schema_cache/stats")
+def schema_cache_stats():
+    """Schema inference cache hit/miss counters."""
+    return jsonify(schema_cache.stats())
+
+@app.route("/metrics")
+def metrics():
+    """Per-stage pipeline timings in the Prometheus text format."""
+    return Response(metrics_store.prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics/runs/<run_id>")
+def run_report(run_id):
+    """Stage report of a single run; the run ID is the job ID."""
+    report = metrics_store.load_report(run_id)
+    if report is None:
+        return jsonify({"error": "Run not found."}), 404
+    return jsonify(report)
+
+@app.route("/quarantine/<job_id>")
+def quarantined_rows(job_id):
+    """Rows of an ETL job that failed validation, as CSV with their row numbers and reasons."""
+    path = os.path.join(app.config["QUARANTINE_DIR"], f"{secure_filename(job_id)}.csv")
+    if not os.path.exists(path):
+        return jsonify({"error": "No quarantined rows for this job."}), 404
+    return send_file(path, mimetype="text/csv", as_attachment=True, download_name=f"quarantine_{job_id}.csv")
+
+@app.route("/db/health")
+def db_health():
+    """Checks the destination database and reports the connection pools of this process."""
+    destination_db = session.get("destination_db")
+    destination = engines.check(destination_uri(destination_db)) if destination_db else None
+    status = 503 if destination and not destination["ok"] else 200
+    return jsonify({"destination": destination, "pools": engines.status()}), status
+
+def _log_filters():
+    """Reads the `level` and `run_id` log filters from the query string."""
+    level = request.args.get("level") or None
+    if level:
+        level_number(level)  # Raises ValueError for unknown levels
+    return {"level": level, "run_id": request.args.get("run_id") or None}
+
+@app.route("/logs")
+def logs():
+    """
+    Log entries as JSON. With an `after` cursor, the entries written since then;
+    otherwise the last `limit` entries, or those before the `before` cursor.
+    """
+    limit = max(1, min(request.args.get("limit", 200, type=int), 1000))
+    try:
+        filters = _log_filters()
+        if request.args.get("after"):
+            page = log_reader.since(request.args["after"], limit=limit, **filters)
+        else:
+            page = log_reader.tail(limit, before=request.args.get("before") or None, **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@app.route("/logs/stream")
+def stream_logs():
+    """
+    Server-sent events carrying the log entries written after the `after` cursor
+    (or the `Last-Event-ID` header on reconnect, or the end of the log).
+
+    The stream ends after `LOG_STREAM_MAX_SECONDS`, so an open tab does not hold a
+    server thread for good; the browser's EventSource reconnects and resumes
+    from the last cursor it was sent.
+    """
+    cursor = request.headers.get("Last-Event-ID") or request.args.get("after") or log_reader.end_cursor()
+    try:
+        filters = _log_filters()
+        log_reader.since(cursor, limit=0)  # Validates the cursor
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    interval = app.config["LOG_STREAM_INTERVAL"]
+    deadline = time.monotonic() + app.config["LOG_STREAM_MAX_SECONDS"]
+
+    def events(cursor):
+        yield f"retry: {int(interval * 1000)}\n\n"
+        while time.monotonic() < deadline:
+            page = log_reader.since(cursor, **filters)
+            cursor = page["after"]
+            if page["entries"]:
+                yield f"id: {cursor}\ndata: {json.dumps(page['entries'])}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            time.sleep(interval)
+        yield f"id: {cursor}\n\n"  # Sets Last-Event-ID for the reconnect without dispatching an event
+
+    return Response(events(cursor), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.route("/delete_logs", methods=["POST"])
 def delete_logs():
     """Delete all logs from the log file."""
-    log_file = app.config["LOG_FILE"]
     try:
-        with open(log_file, "w") as f:
-            f.truncate(0)  # Clear the log file
+        log_reader.clear()  # Empties the log file and removes rotated backups
     except Exception as e:
         flash(f"Failed to delete logs: {e}")
         app.logger.error(f"Error deleting logs: {e}")
     return redirect(url_for("index"))
 
 
+@app.route("/schema/versions")
+def schema_versions():
+    """Schema versions of this session, newest first, with their diffs to the previous version."""
+    return jsonify({"current": session.get("schema_version"), "versions": session_store.schema_versions(session.sid)})
+
+@app.route("/schema/versions/<int:version>")
+def schema_version(version):
+    """One schema version of this session, including its mapping."""
+    entry = session_store.get_schema(session.sid, version)
+    if entry is None:
+        return jsonify({"error": "Schema version not found."}), 404
+    return jsonify(entry)
+
+@app.route("/schema/versions/<int:version>/restore", methods=["POST"])
+def restore_schema_version(version):
+    """Makes an earlier schema version current again, as a new version."""
+    entry = session_store.get_schema(session.sid, version)
+    if entry is None:
+        flash("Schema version not found.")
+    else:
+        save_schema(entry["mapping"], f"restored from version {version}")
+        app.logger.info(f"Schema version {version} restored as version {session['schema_version']}.")
+    return redirect(url_for("schema"))
+
 @app.route("/schema", methods=["GET", "POST"])
 def schema():
     """
@@ -199,19 +451,20 @@ def schema():
     - Handles applying schema changes to PostgreSQL.
     - Updates the number of sample rows for schema inference.
     """
-    schema_mapping = session.get("schema_mapping", {})
-    schema_mapping_updated_sample_rows = None  # Holds inferred schema for Edit Schema
+    collect_inferred_schema()
+    schema_mapping = current_schema()
     sample_rows = session.get("sample_rows", 5)  # Default to 5 sample rows
     # Load existing schema if available
     schema_file = app.config["SCHEMA_FILE"]
-    if "schema_mapping" not in session:
+    if schema_mapping is None:
+        schema_mapping = {}  # Default to empty schema
         if os.path.exists(schema_file):
             try:
                 with open(schema_file, "r") as f:
-                    session["schema_mapping"] = json.load(f)  # Load schema into session
+                    schema_mapping = json.load(f)
+                session["schema_version"] = session_store.save_schema(session.sid, schema_mapping, "file")
             except (FileNotFoundError, json.JSONDecodeError) as e:
                 app.logger.error(f"Error loading schema: {e}")
-                session["schema_mapping"] = {}  # Default to empty schema
                 flash("Failed to load existing schema. Please check the schema file.")
 
     if request.method == "POST":
@@ -220,10 +473,9 @@ def schema():
             try:
                 new_schema = request.form.get("schema")
                 schema_mapping = json.loads(new_schema)
-                session["schema_mapping"] = schema_mapping
-                with open(schema_file, "w") as f:
-                    json.dump(schema_mapping, f, indent=4)
-                app.logger.info("Schema updated and saved successfully.")
+                save_schema(schema_mapping, "edited")
+                session.pop("proposed_schema_version", None)
+                app.logger.info(f"Schema updated and saved successfully (version {session['schema_version']}).")
             except json.JSONDecodeError as e:
                 app.logger.error(f"Invalid JSON schema provided: {e}")
                 flash("Invalid schema format. Please provide valid JSON.")
@@ -235,22 +487,33 @@ def schema():
                 flash("Destination database connection details are missing. Please set them first.")
                 return redirect(url_for("set_destination_db"))
 
-            db_uri = (
-                f"postgresql://{destination_db['user']}:{destination_db['password']}@"
-                f"{destination_db['host']}:{destination_db['port']}/{destination_db['name']}"
-            )
+            db_uri = destination_uri(destination_db)
 
             csv_file_path = session.get("uploaded_file_path", "")
             if not csv_file_path:
                 flash("No CSV file uploaded. Please upload a file before applying schema changes.")
                 return redirect(url_for("upload_file"))
 
+            from app.transform import LOAD_MODES, table_name_for
+
+            load_mode = request.form.get("load_mode", "replace")
+            if load_mode not in LOAD_MODES:
+                flash(f"Unknown load mode '{load_mode}'. Expected one of {', '.join(LOAD_MODES)}.")
+                return redirect(url_for("schema"))
+
             app.logger.info("Initiating ETL pipeline...")
             try:
-                transformed_df = transform_data(csv_file_path, schema_mapping)
-                table_name = app.config["TABLE_NAME"]
-                load_data_to_postgres(transformed_df, table_name, db_uri)
-                app.logger.info("ETL pipeline executed successfully.")
+                job_id = get_job_manager().submit(
+                    "etl",
+                    csv_file_path=csv_file_path,
+                    schema_mapping=schema_mapping,
+                    table_name=app.config["TABLE_NAME"] or table_name_for(csv_file_path),
+                    db_uri=db_uri,
+                    chunksize=app.config["TRANSFORM_CHUNKSIZE"],
+                    load_mode=load_mode,
+                    workers=app.config["TRANSFORM_WORKERS"],
+                )
+                flash(f"ETL pipeline started (job {job_id}).")
             except Exception as e:
                 app.logger.error(f"Pipeline execution failed: {e}")
                 flash(f"Pipeline execution failed: {e}")
@@ -269,13 +532,11 @@ def schema():
                         flash("No CSV file uploaded. Please upload a file first.")
                         return redirect(url_for("upload_file"))
 
-                    # Infer schema using the updated number of sample rows
-                    api_key = session["openai_api_key"]
-                    client = OpenAI(api_key=api_key)
-                    model = session.get("selected_model", "gpt-3.5-turbo")
-                    schema_mapping_updated_sample_rows = infer_schema_logic(csv_file_path, client, model, sample_rows)
-                    flash(f"Schema inferred using {sample_rows} sample rows successfully!")
-                    app.logger.info(f"Schema updated with {sample_rows} sample rows.")
+                    # Infer the schema again with the updated number of sample rows
+                    job_id = submit_inference(csv_file_path, sample_rows, proposal=True)
+                    flash(f"Schema inference with {sample_rows} sample rows started (job {job_id}). "
+                          "Refresh the page to review the result in Edit Schema.")
+                    app.logger.info(f"Schema inference with {sample_rows} sample rows queued as job {job_id}.")
                 else:
                     app.logger.info("Invalid sample rows value. No action taken.")
                     flash("Invalid sample rows value. Please enter a valid number greater than 0.")
@@ -284,13 +545,14 @@ def schema():
                 flash(f"Failed to update schema using {sample_rows} rows: {e}")
     if not isinstance(sample_rows, int) or sample_rows <= 0:
         sample_rows = 5  # Default to 5 if invalid
+    # A re-inferred schema waiting for review is offered in Edit Schema
+    proposed = None
+    if session.get("proposed_schema_version"):
+        proposed = session_store.get_schema(session.sid, session["proposed_schema_version"])
     # Render the schemas properly
     return render_template(
         "schema.html",
-        schema=json.dumps(
-            schema_mapping_updated_sample_rows if schema_mapping_updated_sample_rows else schema_mapping,
-            indent=4
-        ),  # For Edit Schema
+        schema=json.dumps(proposed["mapping"] if proposed else schema_mapping, indent=4),  # For Edit Schema
         current_schema=json.dumps(schema_mapping, indent=4),  # For Current Schema
         sample_rows=sample_rows
     )
@@ -0,0 +1,141 @@
+import logging
+import threading
+from multiprocessing.util import Finalize
+
+from app.config import Config
+
+# SQLAlchemy is imported on first use, so the dashboard and the CLI start
+# without it until a destination is actually contacted
+
+
+def destination_uri(destination_db):
+    """
+    Builds the connection URI of a destination database.
+
+    Args:
+        destination_db (dict): Connection details with `host`, `port`, `name`,
+            `user` and `password`, as stored by the dashboard.
+
+    Returns:
+        str: PostgreSQL connection URI, with the credentials escaped.
+    """
+    from sqlalchemy.engine import URL
+
+    url = URL.create(
+        "postgresql+psycopg2",  # Loads use psycopg2's COPY API, not the psycopg 3 default of SQLAlchemy 2
+        username=destination_db["user"],
+        password=destination_db["password"],
+        host=destination_db["host"],
+        port=int(destination_db.get("port") or 5432),
+        database=destination_db["name"],
+    )
+    return url.render_as_string(hide_password=False)
+
+
+class EngineRegistry:
+    """
+    Keeps one SQLAlchemy engine, and thus one connection pool, per destination
+    database for the lifetime of the process.
+
+    Loads that target the same database reuse pooled connections instead of
+    paying for a new pool and connection handshake each time. Pools are
+    bounded, so with `JOB_WORKERS` worker processes a destination sees at most
+    `JOB_WORKERS * (pool_size + max_overflow)` connections, and connections are
+    pinged before use so ones dropped by the server are replaced transparently.
+    """
+
+    def __init__(self, pool_size=2, max_overflow=3, pool_timeout=30, pool_recycle=1800):
+        """
+        Args:
+            pool_size (int): Connections kept open per destination.
+            max_overflow (int): Extra connections allowed under load.
+            pool_timeout (int): Seconds to wait for a free connection.
+            pool_recycle (int): Seconds after which a connection is reopened.
+        """
+        self.pool_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_recycle": pool_recycle,
+        }
+        self._engines = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _key(connection_uri):
+        from sqlalchemy.engine import make_url
+
+        return make_url(connection_uri).render_as_string(hide_password=False)
+
+    def get(self, connection_uri):
+        """Returns the engine of a destination, creating it on first use."""
+        from sqlalchemy import create_engine
+        from sqlalchemy.engine import make_url
+
+        key = self._key(connection_uri)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                options = {"pool_pre_ping": True}
+                if make_url(key).get_backend_name() != "sqlite":
+                    # SQLite uses a file or in-memory pool without these settings
+                    options.update(self.pool_options)
+                engine = create_engine(key, **options)
+                self._engines[key] = engine
+                self.logger.info(f"Created connection pool for {engine.url}.")
+            return engine
+
+    def check(self, connection_uri):
+        """
+        Checks that a destination accepts connections.
+
+        Returns:
+            dict: `ok`, the pool status (None if no engine could be created for
+            the URI, e.g. when it is malformed or its driver is missing) and, on
+            failure, the `error`.
+        """
+        from sqlalchemy import text
+
+        engine = None
+        try:
+            engine = self.get(connection_uri)
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return {"ok": True, "pool": engine.pool.status()}
+        except Exception as e:
+            destination = engine.url if engine is not None else "an unusable destination URI"
+            self.logger.warning(f"Health check of {destination} failed: {e}")
+            return {"ok": False, "pool": engine.pool.status() if engine is not None else None, "error": str(e)}
+
+    def status(self):
+        """Returns the pool status of every destination, with passwords masked."""
+        with self._lock:
+            return {str(engine.url): engine.pool.status() for engine in self._engines.values()}
+
+    def dispose(self, connection_uri=None):
+        """Closes the pooled connections of one destination, or of all destinations."""
+        with self._lock:
+            if connection_uri is None:
+                engines, self._engines = list(self._engines.values()), {}
+            else:
+                engine = self._engines.pop(self._key(connection_uri), None)
+                engines = [engine] if engine is not None else []
+        for engine in engines:
+            engine.dispose()
+
+
+engines = EngineRegistry(
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
+    pool_timeout=Config.DB_POOL_TIMEOUT,
+    pool_recycle=Config.DB_POOL_RECYCLE,
+)
+# Runs at exit of the dashboard and of job worker processes alike (atexit hooks
+# are skipped in multiprocessing workers)
+Finalize(engines, engines.dispose, exitpriority=10)
+
+
+def get_engine(connection_uri):
+    """Returns the pooled engine of a destination from the process-wide registry."""
+    return engines.get(connection_uri)
@@ -0,0 +1,404 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested."""
+
+
+class JobStore:
+    """
+    SQLite-backed job table shared by the dashboard and the worker processes.
+
+    Every call opens its own short-lived connection, so the store can be used
+    from any thread or process. A job's credentials are kept encrypted in the
+    `secrets` column (see `JobManager`) and cleared once the job finishes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "secrets" not in columns:  # Created by an earlier version
+                conn.execute("ALTER TABLE jobs ADD COLUMN secrets TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind, args):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, args, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(args), now, now),
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        if fields.get("status") in FINISHED_STATUSES:
+            fields["secrets"] = None
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id, include_args=False):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row, include_args) if row else None
+
+    def get_secrets(self, job_id):
+        """Returns the encrypted credentials of a job, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT secrets FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["secrets"] if row else None
+
+    def list(self, limit=50):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def redact_args(self, secret_args):
+        """Removes secret arguments (kind -> argument names) from the stored args of every job."""
+        with self._connect() as conn:
+            for row in conn.execute("SELECT id, kind, args FROM jobs").fetchall():
+                args = json.loads(row["args"])
+                kept = {name: value for name, value in args.items() if name not in secret_args.get(row["kind"], ())}
+                if kept != args:
+                    conn.execute("UPDATE jobs SET args = ? WHERE id = ?", (json.dumps(kept), row["id"]))
+
+    def unfinished(self):
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id FROM jobs WHERE status NOT IN ({placeholders}) ORDER BY created_at",
+                FINISHED_STATUSES,
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    @staticmethod
+    def _to_dict(row, include_args=False):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job.pop("secrets", None)
+        args = job.pop("args")
+        if include_args:
+            job["args"] = json.loads(args)
+        return job
+
+
+class JobContext:
+    """Handed to a running job to report progress and observe cancellation."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def check_cancelled(self):
+        job = self.store.get(self.job_id)
+        if job and job["cancel_requested"]:
+            raise JobCancelled(f"Job {self.job_id} was cancelled.")
+
+    def report(self, progress, message=None):
+        """Records progress (e.g. rows processed) and stops the job if it was cancelled."""
+        self.store.update(self.job_id, progress=progress, message=message)
+        self.check_cancelled()
+
+
+def _metrics_store():
+    from app.config import Config
+    from app.metrics import MetricsStore
+
+    return MetricsStore(
+        Config.METRICS_DB, Config.METRICS_REPORT_DIR, Config.METRICS_TTL, Config.METRICS_MAX_RUNS, Config.METRICS_WINDOW
+    )
+
+
+def run_pipeline(csv_file_path, schema_mapping, table_name, db_uri, chunksize, load_mode="replace", workers=1,
+                 streams=None, run_id=None, progress=None):
+    """
+    Transforms a CSV in chunks, on `workers` processes, and loads it into the destination table.
+
+    Rows failing validation are written to `<QUARANTINE_DIR>/<run_id>.csv` instead of being loaded.
+    Replaced tables are written over `streams` connections (`LOAD_STREAMS` by default) and swapped
+    in once indexed. The run's metrics are saved to the metrics store, like those of dashboard jobs.
+
+    Args:
+        run_id (str, optional): ID of the run's metrics and quarantine file; generated if omitted.
+        progress (callable, optional): Called with the number of rows transformed so far and a message.
+
+    Returns:
+        dict: Load statistics (see `load_data_to_postgres`) with the `quarantine` report.
+    """
+    from app.config import Config
+    from app.transform import transform_data, load_data_to_postgres, get_primary_key, get_unique_columns
+    from app.metrics import RunMetrics
+    from app.validation import Quarantine
+
+    def tracked(chunks):
+        rows = 0
+        for chunk in chunks:
+            rows += len(chunk)
+            if progress is not None:
+                progress(rows, f"Transformed {rows} rows.")
+            yield chunk
+
+    metrics = RunMetrics(run_id=run_id)
+    quarantine = Quarantine(os.path.join(Config.QUARANTINE_DIR, f"{metrics.run_id}.csv"))
+    try:
+        chunks = transform_data(
+            csv_file_path, schema_mapping, chunksize=chunksize, metrics=metrics, workers=workers, quarantine=quarantine
+        )
+        stats = load_data_to_postgres(
+            tracked(chunks), table_name, db_uri, mode=load_mode,
+            primary_key=get_primary_key(schema_mapping), metrics=metrics,
+            unique=get_unique_columns(schema_mapping), streams=streams or Config.LOAD_STREAMS,
+        )
+        stats["quarantine"] = quarantine.report()
+        return stats
+    finally:
+        _metrics_store().save(metrics)
+
+
+def run_etl_job(context, csv_file_path, schema_mapping, table_name, db_uri, chunksize, load_mode="replace", workers=1):
+    """Runs the pipeline on the uploaded CSV as job `context.job_id`, see `run_pipeline`."""
+    return run_pipeline(
+        csv_file_path, schema_mapping, table_name, db_uri, chunksize, load_mode=load_mode, workers=workers,
+        run_id=context.job_id, progress=context.report,
+    )
+
+
+def run_infer_schema_job(context, csv_file_path, api_key, model, sample_rows, local_types, cache_config,
+                         profile_rows=None):
+    """Infers the schema of the uploaded CSV from its profile and, for the columns it leaves open, the LLM."""
+    from openai import OpenAI
+    from app.llm_utils import infer_schema_logic
+    from app.schema_cache import SchemaCache
+    from app.metrics import RunMetrics
+
+    context.report(0, "Profiling columns and inferring schema...")
+    client = OpenAI(api_key=api_key)
+    cache = SchemaCache(**cache_config)
+    metrics = RunMetrics(run_id=context.job_id)
+    try:
+        return infer_schema_logic(
+            csv_file_path, client, model, sample_rows, cache=cache, metrics=metrics, local_types=local_types,
+            profile_rows=profile_rows,
+        )
+    finally:
+        _metrics_store().save(metrics)
+
+
+def run_convert_job(context, csv_file_path, chunksize):
+    """Converts the uploaded CSV into its columnar cache, which later jobs read instead of the CSV."""
+    from app.columnar import convert_csv
+
+    context.report(0, "Converting upload to Parquet...")
+    start = time.perf_counter()
+    path = convert_csv(csv_file_path, chunksize=chunksize)
+    return {"path": path, "seconds": time.perf_counter() - start}
+
+
+JOB_KINDS = {
+    "etl": run_etl_job,
+    "infer_schema": run_infer_schema_job,
+    "convert": run_convert_job,
+}
+# Arguments never written to the job store in clear text: they are handed to
+# the worker process directly and stored encrypted only to resume the job
+SECRET_ARGS = {
+    "etl": ("db_uri",),
+    "infer_schema": ("api_key",),
+}
+
+
+def _fernet(secret_key):
+    """Cipher for job credentials, keyed by the dashboard's `SECRET_KEY`."""
+    from cryptography.fernet import Fernet
+
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret_key.encode("utf-8")).digest()))
+
+
+def _init_worker():
+    from app.logging_config import configure_console_logging
+
+    configure_console_logging()
+
+
+def execute_job(db_path, job_id, secrets=None):
+    """Worker-process entry point: runs one persisted job, with its `secrets` arguments, and records its outcome."""
+    store = JobStore(db_path)
+    job = store.get(job_id, include_args=True)
+    if job is None or job["status"] in FINISHED_STATUSES:
+        return
+    context = JobContext(store, job_id)
+    try:
+        context.check_cancelled()
+        store.update(job_id, status=RUNNING, message="Started.")
+        result = JOB_KINDS[job["kind"]](context, **job["args"], **(secrets or {}))
+        store.update(job_id, status=SUCCEEDED, result=result, message="Finished.")
+    except JobCancelled as e:
+        store.update(job_id, status=CANCELLED, message=str(e))
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Job {job_id} failed: {e}")
+        store.update(job_id, status=FAILED, error=str(e))
+
+
+class JobManager:
+    """
+    Runs ETL and schema inference jobs in a process pool.
+
+    Job state lives in SQLite, so jobs that were queued or running when the
+    dashboard stopped are resubmitted on the next start. Their credentials
+    (`SECRET_ARGS`) are stored encrypted with `secret_key` until the job
+    finishes; without a key, or when the key has changed, such jobs fail on
+    restart instead. Every job kind is safe to rerun: upserts run in a single
+    transaction, and "replace" loads only swap the new table in once all rows
+    are in, so an interrupted run at most leaves a `<table>_load_<id>` staging
+    table behind.
+    """
+
+    def __init__(self, db_path, max_workers=None, logger=None, secret_key=None):
+        self.db_path = db_path
+        self.store = JobStore(db_path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.cipher = _fernet(secret_key) if secret_key else None
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=get_context("spawn"), initializer=_init_worker
+        )
+        self.futures = {}
+        self.resume()
+
+    def resume(self):
+        """
+        Resubmits jobs left unfinished by a previous run, with their decrypted
+        credentials. Jobs whose credentials cannot be recovered fail instead.
+        """
+        self.store.redact_args(SECRET_ARGS)  # Stored in clear text by earlier versions
+        for job_id in self.store.unfinished():
+            secrets = None
+            if SECRET_ARGS.get(self.store.get(job_id)["kind"]):
+                secrets = self._decrypt(self.store.get_secrets(job_id))
+                if secrets is None:
+                    self.store.update(
+                        job_id, status=FAILED,
+                        error="Interrupted by a restart and its credentials could not be recovered; start it again.",
+                    )
+                    self.logger.warning(f"Job {job_id} was interrupted by a restart and cannot be resumed.")
+                    continue
+            self.store.update(job_id, status=QUEUED, message="Resumed after restart.")
+            self._dispatch(job_id, secrets)
+            self.logger.info(f"Resumed job {job_id}.")
+
+    def _decrypt(self, token):
+        """Returns the credentials stored with a job, or None if there are none or the key changed."""
+        if token is None or self.cipher is None:
+            return None
+        from cryptography.fernet import InvalidToken
+
+        try:
+            return json.loads(self.cipher.decrypt(token.encode("ascii")))
+        except InvalidToken:
+            return None
+
+    def submit(self, kind, **args):
+        """
+        Queues a job and returns its ID. Its `SECRET_ARGS` are passed to the
+        worker directly and only stored encrypted, so the job can be resumed.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'.")
+        secrets = {name: args.pop(name) for name in SECRET_ARGS.get(kind, ()) if name in args}
+        job_id = self.store.create(kind, args)
+        if secrets and self.cipher is not None:
+            token = self.cipher.encrypt(json.dumps(secrets).encode("utf-8")).decode("ascii")
+            self.store.update(job_id, secrets=token)
+        self._dispatch(job_id, secrets)
+        self.logger.info(f"Queued {kind} job {job_id}.")
+        return job_id
+
+    def _dispatch(self, job_id, secrets=None):
+        future = self.executor.submit(execute_job, self.db_path, job_id, secrets)
+        self.futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+
+    def _on_done(self, job_id, future):
+        self.futures.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            # The worker died before it could record the outcome itself
+            self.store.update(job_id, status=FAILED, error=str(error))
+        job = self.store.get(job_id)
+        if job["status"] == FAILED:
+            self.logger.error(f"Job {job_id} failed: {job['error']}")
+        else:
+            self.logger.info(f"Job {job_id} {job['status']}.")
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def list(self, limit=50):
+        return self.store.list(limit)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. Queued jobs are removed from the pool; running jobs stop
+        at their next progress report and roll back.
+
+        Returns:
+            bool: False if the job does not exist or has already finished.
+        """
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return False
+        self.store.update(job_id, cancel_requested=1)
+        future = self.futures.get(job_id)
+        if future is not None and future.cancel():
+            self.store.update(job_id, status=CANCELLED, message="Cancelled before start.")
+        self.logger.info(f"Cancellation requested for job {job_id}.")
+        return True
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
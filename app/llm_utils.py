@@ -1,31 +1,30 @@
-from openai import OpenAI
+import asyncio
 import logging
-import pandas as pd
 import json
+import random
 import re
+from app.profiling import PROFILE_VERSION, profile_csv, schema_from_profile
+from app.metrics import RunMetrics
+from app.upload import content_hash
 
+# Bump whenever the prompt below changes so cached schemas are not reused.
+PROMPT_VERSION = 4
+MAX_TOKENS = 1024
+TOKENS_PER_COLUMN = 64  # Rough size of one column's entry in the JSON reply
 
-def infer_schema_logic(file_path, client, model, sample_rows=5):
-    """
-    Uses LLM (OpenAI) to infer the schema of a CSV file.
-
-    Args:
-        file_path (str): Path to the CSV file.
-        sample_rows (int): Number of rows to sample for schema inference.
-
-    Returns:
-        dict: Schema mapping where keys are source column names and values are dictionaries with `name` and `type`.
-    """
-    logger = logging.getLogger(__name__)  
-
-    # Load the CSV file
-    df = pd.read_csv(file_path)
-
-    sample_data = df.head(sample_rows).to_dict(orient="records")
 
-    # Construct the prompt for the LLM
-    prompt = f"""
+def build_schema_prompt(column_profiles):
+    """Builds the schema inference prompt for the profiles of some columns, see `app.profiling.profile_csv`."""
+    profile_lines = "\n".join(
+        f"    {json.dumps(column)}: {json.dumps(stats, default=str)}" for column, stats in column_profiles.items()
+    )
+    return f"""
     Analyze the following dataset and infer a schema for mapping source columns to a target structure.
+    Each source column is described by statistics computed over the whole file (over its first rows only
+    when "sampled" is true, so values seen there may not hold for the rest): the number and fraction of
+    missing values, the number of distinct values (estimated when "distinct_exact" is false), whether all
+    values are distinct ("unique"), the smallest and largest value, the value pattern all values match
+    (when one was found), the date formats that fit every value (when several do) and a few example values.
     Provide the output as a JSON object where each source column maps to a dictionary containing:
     - "name": the target column name
     - "type": the data type (e.g., "string", "integer", "float", "date")
@@ -33,10 +32,12 @@ def infer_schema_logic(file_path, client, model, sample_rows=5):
         - "required": whether the column must have a value (true/false)
         - "unique": whether the values in the column must be unique (true/false)
     - "primary_key": whether this column is the primary key for the dataset (true/false).
+    - "format": for "date" columns only, the strptime format of the values (e.g., "%Y-%m-%d").
     
     Make sure to identify the primary key accurately if the dataset contains an obvious unique identifier.
-    Dataset sample:
-    {sample_data}
+    A column can only be unique or the primary key if all of its values are distinct.
+    Column profiles:
+{profile_lines}
     Example response:
     {{
         "ColumnA": {{
@@ -59,36 +60,272 @@ def infer_schema_logic(file_path, client, model, sample_rows=5):
         }}
     }}
     """
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=1024
+
+
+def parse_schema_response(message_content):
+    """
+    Extracts the schema mapping from the LLM's reply.
+
+    Columns whose entry lacks `name` or `type` fall back to a lowercase string column.
+    """
+    logger = logging.getLogger(__name__)
+
+    if not message_content:
+        raise ValueError("OpenAI API returned an empty response.")
+
+    # Extract JSON
+    json_match = re.search(r"\{.*\}", message_content, re.DOTALL)
+    if not json_match:
+        raise ValueError("No JSON object found in the response.")
+    raw_schema_mapping = json.loads(json_match.group())
+
+    schema_mapping = {}
+    for column, target in raw_schema_mapping.items():
+        if isinstance(target, dict) and "name" in target and "type" in target:
+            schema_mapping[column] = target
+        else:
+            logger.warning(f"Unexpected format for column '{column}': {target}")
+            schema_mapping[column] = {"name": column.lower(), "type": "string"}  # Fallback
+    return schema_mapping
+
+
+def _profile_columns(file_path, sample_rows, local_types, metrics, cache=None, profile_rows=None):
+    """
+    Profiles the file, or its first `profile_rows` rows, and types the columns
+    the profile settles. With a `cache`, the result is stored under the file's
+    content hash, so an unchanged file is not profiled again.
+
+    Returns:
+        tuple: (schema mapping of the columns typed locally, profiles of the
+        columns left for the LLM, list of all columns in file order).
+    """
+    profile_key = None
+    if cache is not None:
+        profile_key = cache.make_profile_key(
+            content_hash(file_path), sample_rows, local_types, PROFILE_VERSION, max_rows=profile_rows
         )
+        cached = cache.get(profile_key, kind="profile")
+        if cached is not None:
+            logging.getLogger(__name__).info(f"Profile of {file_path} found in cache; skipping profiling.")
+            return cached["local_schema"], cached["profiles"], cached["columns"]
 
-        logger.debug(f"Raw OpenAI API response: {response}")  
+    with metrics.stage("profile") as stage:
+        profile = profile_csv(file_path, max_examples=sample_rows, max_rows=profile_rows)
+        stage["rows"] = profile["rows"]
+    if local_types:
+        local_schema, pending = schema_from_profile(profile)
+    else:
+        local_schema, pending = {}, list(profile["columns"])
+    # Stored as JSON, so hits and misses describe the columns identically
+    result = json.loads(json.dumps({
+        "local_schema": local_schema,
+        "profiles": {column: profile["columns"][column] for column in pending},
+        "columns": list(profile["columns"]),
+    }, default=str))
+    if cache is not None:
+        cache.set(profile_key, result)
+    return result["local_schema"], result["profiles"], result["columns"]
 
 
-        message_content = response.choices[0].message.content
+def _combine_schemas(columns, local_schema, llm_schemas, file_path):
+    """
+    Merges the locally typed columns with the LLM's replies, in file order.
+    A primary key chosen from the profile wins over ones the LLM proposed, and
+    of several proposed ones only the first is kept.
+    """
+    logger = logging.getLogger(__name__)
+    merged = dict(local_schema)
+    for part in llm_schemas:
+        merged.update(part)
+    schema_mapping = {column: merged[column] for column in columns if column in merged}
+    schema_mapping.update({column: target for column, target in merged.items() if column not in schema_mapping})
+
+    primary_keys = [column for column, target in schema_mapping.items() if target.get("primary_key")]
+    local_keys = [column for column in primary_keys if column in local_schema]
+    keep = local_keys[0] if local_keys else primary_keys[0] if primary_keys else None
+    for column in primary_keys:
+        if column != keep:
+            logger.warning(f"Multiple primary keys inferred for {file_path}; keeping '{keep}', not '{column}'.")
+            schema_mapping[column]["primary_key"] = False
+    return schema_mapping
 
-        if not message_content:
-            raise ValueError("OpenAI API returned an empty response.")
 
-        # Extract JSON
-        json_match = re.search(r"\{.*\}", message_content, re.DOTALL)
-        if not json_match:
-            raise ValueError("No JSON object found in the response.")
-        raw_schema_mapping = json.loads(json_match.group())
+def infer_schema_logic(file_path, client, model, sample_rows=5, cache=None, metrics=None, local_types=True,
+                       profile_rows=None):
+    """
+    Uses LLM (OpenAI) to infer the schema of a CSV file.
 
-        schema_mapping = {}
-        for column, target in raw_schema_mapping.items():
-            if isinstance(target, dict) and "name" in target and "type" in target:
-                schema_mapping[column] = target
-            else:
-                logger.warning(f"Unexpected format for column '{column}': {target}")
-                schema_mapping[column] = {"name": column.lower(), "type": "string"}  # Fallback
+    The file is profiled in one streaming pass first (see
+    `app.profiling.profile_csv`). Columns whose type the profile settles are
+    typed locally when `local_types` is set; only the remaining ones are sent
+    to the LLM, described by their profile rather than by raw rows. If every
+    column is settled, the LLM is not called at all.
 
-        return schema_mapping
+    Args:
+        file_path (str): Path to the CSV file.
+        sample_rows (int): Number of example values per column shown to the LLM.
+        cache (SchemaCache, optional): Cache of the file's profile, by content
+            hash, and of the LLM's replies. If the call fails, an expired
+            entry for the same profile is used.
+        metrics (RunMetrics, optional): Receives the "profile" and "llm" stage timings.
+        local_types (bool): Type the columns the profile settles without the LLM.
+        profile_rows (int, optional): Rows profiled at most, see `Config.PROFILE_MAX_ROWS`;
+            the whole file by default.
+
+    Returns:
+        dict: Schema mapping where keys are source column names and values are dictionaries with `name` and `type`.
+    """
+    logger = logging.getLogger(__name__)  
+    metrics = metrics or RunMetrics()
+
+    local_schema, column_profiles, columns = _profile_columns(
+        file_path, sample_rows, local_types, metrics, cache, profile_rows
+    )
+    if not column_profiles:
+        logger.info(f"All {len(columns)} columns typed from the profile; skipping LLM call.")
+        return _combine_schemas(columns, local_schema, [], file_path)
+    logger.info(f"Typed {len(local_schema)} of {len(columns)} columns from the profile; asking the LLM for the rest.")
+
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(list(column_profiles), column_profiles, model, PROMPT_VERSION)
+        cached_schema = cache.get(cache_key)
+        if cached_schema is not None:
+            logger.info("Schema found in cache; skipping LLM call.")
+            return _combine_schemas(columns, local_schema, [cached_schema], file_path)
+
+    # Construct the prompt for the LLM
+    prompt = build_schema_prompt(column_profiles)
+    try:
+        with metrics.stage("llm"):
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                max_tokens=MAX_TOKENS
+            )
+
+        logger.debug(f"Raw OpenAI API response: {response}")  
+
+        llm_schema = parse_schema_response(response.choices[0].message.content)
+
+        if cache is not None:
+            cache.set(cache_key, llm_schema)
+        return _combine_schemas(columns, local_schema, [llm_schema], file_path)
     except Exception as e:
+        if cache is not None:
+            stale_schema = cache.get(cache_key, allow_stale=True)
+            if stale_schema is not None:
+                logger.warning(f"Schema inference failed ({e}); using expired cached schema.")
+                return _combine_schemas(columns, local_schema, [stale_schema], file_path)
         raise RuntimeError(f"Error during schema inference: {e}")
+
+
+async def _request_schema(client, model, column_profiles, semaphore, max_retries, backoff):
+    """Sends one prompt with retries and exponential backoff; returns the parsed mapping."""
+    logger = logging.getLogger(__name__)
+    prompt = build_schema_prompt(column_profiles)
+    for attempt in range(max_retries + 1):
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0,
+                    max_tokens=MAX_TOKENS
+                )
+            return parse_schema_response(response.choices[0].message.content)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            logger.warning(f"Schema inference request failed ({e}); retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+
+async def _infer_file_schema(file_path, client, model, semaphore, sample_rows, local_types,
+                             columns_per_prompt, max_retries, backoff, cache, profile_rows):
+    logger = logging.getLogger(__name__)
+    local_schema, column_profiles, columns = await asyncio.to_thread(
+        _profile_columns, file_path, sample_rows, local_types, RunMetrics(), cache, profile_rows
+    )
+    if not column_profiles:
+        logger.info(f"All columns of {file_path} typed from the profile; skipping LLM call.")
+        return _combine_schemas(columns, local_schema, [], file_path)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(list(column_profiles), column_profiles, model, PROMPT_VERSION)
+        cached_schema = cache.get(cache_key)
+        if cached_schema is not None:
+            logger.info(f"Schema for {file_path} found in cache; skipping LLM call.")
+            return _combine_schemas(columns, local_schema, [cached_schema], file_path)
+
+    # Wide tables are split so that each reply fits into MAX_TOKENS
+    pending = list(column_profiles)
+    batches = [pending[i:i + columns_per_prompt] for i in range(0, len(pending), columns_per_prompt)]
+    parts = await asyncio.gather(*(
+        _request_schema(
+            client, model, {column: column_profiles[column] for column in batch}, semaphore, max_retries, backoff
+        )
+        for batch in batches
+    ))
+
+    # Each batch only saw some columns, so several may claim the primary key
+    llm_schema = _combine_schemas(pending, {}, parts, file_path)
+    if cache is not None:
+        cache.set(cache_key, llm_schema)
+    return _combine_schemas(columns, local_schema, [llm_schema], file_path)
+
+
+async def infer_schemas_async(file_paths, client, model, sample_rows=5, max_concurrency=4, columns_per_prompt=None,
+                              max_retries=3, backoff=1.0, cache=None, local_types=True, profile_rows=None):
+    """
+    Infers the schemas of many CSV files concurrently.
+
+    Args:
+        file_paths (list): Paths to the CSV files.
+        client (AsyncOpenAI): Asynchronous OpenAI-compatible client. Point its
+            `base_url` at a local server to run without the OpenAI API.
+        model (str): Chat completion model.
+        sample_rows (int): Number of example values per column shown to the LLM.
+        max_concurrency (int): Maximum number of requests in flight.
+        columns_per_prompt (int, optional): Columns sent per request. Defaults to
+            as many as fit a reply of `MAX_TOKENS` tokens.
+        max_retries (int): Retries per request after the first attempt.
+        backoff (float): Base delay in seconds, doubled on every retry.
+        cache (SchemaCache, optional): Cache of the files' profiles and of the LLM's replies.
+        local_types (bool): Type the columns the profile settles without the
+            LLM, see `infer_schema_logic`.
+        profile_rows (int, optional): Rows profiled at most per file, see `infer_schema_logic`.
+
+    Returns:
+        tuple: (dict of file path -> schema mapping, dict of file path -> error
+        message for the files that failed).
+    """
+    logger = logging.getLogger(__name__)
+    columns_per_prompt = columns_per_prompt or max(1, MAX_TOKENS // TOKENS_PER_COLUMN)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(
+        *(
+            _infer_file_schema(file_path, client, model, semaphore, sample_rows, local_types,
+                               columns_per_prompt, max_retries, backoff, cache, profile_rows)
+            for file_path in file_paths
+        ),
+        return_exceptions=True,
+    )
+
+    schemas, errors = {}, {}
+    for file_path, result in zip(file_paths, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error during schema inference for {file_path}: {result}")
+            errors[file_path] = str(result)
+        else:
+            schemas[file_path] = result
+    logger.info(f"Inferred schemas for {len(schemas)} of {len(file_paths)} files.")
+    return schemas, errors
+
+
+def infer_schemas_batch(file_paths, client, model, **kwargs):
+    """Synchronous wrapper around `infer_schemas_async` for callers without an event loop."""
+    return asyncio.run(infer_schemas_async(file_paths, client, model, **kwargs))
@@ -0,0 +1,268 @@
+import logging
+import os
+import re
+
+LOG_LINE = re.compile(r"^(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - (?P<level>[A-Z]+) - (?P<message>.*)$")
+RUN_ID = re.compile(r"\b[0-9a-f]{32}\b")
+
+
+def parse_line(line):
+    """
+    Splits a log line written by `configure_logging` into its fields.
+
+    Returns:
+        dict or None: timestamp, level, message and the run (job) ID mentioned in
+        the message, or None for a continuation line (e.g. of a multi-line error).
+    """
+    match = LOG_LINE.match(line)
+    if not match:
+        return None
+    entry = match.groupdict()
+    run_id = RUN_ID.search(entry["message"])
+    entry["run_id"] = run_id.group(0) if run_id else None
+    return entry
+
+
+def level_number(level):
+    """Converts a level name such as "WARNING" to its number."""
+    number = logging.getLevelName(str(level).upper())
+    if not isinstance(number, int):
+        raise ValueError(f"Unknown log level '{level}'.")
+    return number
+
+
+def _decode(raw):
+    return raw.decode("utf-8", errors="replace").rstrip("\r")
+
+
+class LogReader:
+    """
+    Reads the rotating application log without loading it whole.
+
+    Positions in the log are cursors of the form "<inode>-<offset>": the inode
+    identifies the file (the current log or one of its numbered backups) and
+    the offset is a byte position in it, so clients keep their place across
+    rotations. Every call reads at most about `max_scan_bytes`, so the cost of
+    a request does not grow with the size of the log.
+    """
+
+    def __init__(self, log_file, backup_count=10, block_size=64 * 1024, max_scan_bytes=4 * 1024 * 1024):
+        """
+        Args:
+            log_file (str): Path of the current log file.
+            backup_count (int): Number of rotated backups (`<log_file>.1` is the newest).
+            block_size (int): Bytes read from disk at a time.
+            max_scan_bytes (int): Bytes read per call before returning what was found.
+        """
+        self.log_file = log_file
+        self.backup_count = backup_count
+        self.block_size = block_size
+        self.max_scan_bytes = max_scan_bytes
+
+    def files(self):
+        """Returns (path, inode, size) of the existing log files, newest first."""
+        paths = [self.log_file] + [f"{self.log_file}.{i}" for i in range(1, self.backup_count + 1)]
+        files = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, stat.st_ino, stat.st_size))
+        return files
+
+    def _locate(self, files, cursor):
+        """Returns (file index, offset) of a cursor; unknown files restart at the beginning of the current log."""
+        try:
+            inode, offset = (int(part) for part in cursor.split("-"))
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid log cursor '{cursor}'.")
+        for index, (_, file_inode, size) in enumerate(files):
+            if file_inode == inode:
+                # A truncated log (e.g. after "Delete All Logs") restarts at 0
+                return index, offset if offset <= size else 0
+        return 0, 0
+
+    def _lines_backward(self, path, end):
+        """Yields (start offset, line) of the complete lines before `end`, last line first."""
+        with open(path, "rb") as f:
+            position, carry = end, b""
+            while position > 0:
+                size = min(self.block_size, position)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + carry).split(b"\n")
+                carry = lines.pop(0)
+                start = position + len(carry) + 1
+                starts = []
+                for line in lines:
+                    starts.append(start)
+                    start += len(line) + 1
+                for start, line in zip(reversed(starts), reversed(lines)):
+                    if line:
+                        yield start, line
+            if carry:
+                yield 0, carry
+
+    def _lines_forward(self, path, start):
+        """Yields (start offset, line) of the complete lines from `start` on; a line still being written is left out."""
+        with open(path, "rb") as f:
+            f.seek(start)
+            carry = b""
+            while True:
+                data = f.read(self.block_size)
+                if not data:
+                    return
+                lines = (carry + data).split(b"\n")
+                carry = lines.pop()
+                for line in lines:
+                    yield start, line
+                    start += len(line) + 1
+
+    def _complete_end(self, path, size):
+        """Offset just past the last complete line of a file."""
+        for start, line in self._lines_backward(path, size):
+            return start + len(line) + 1 if start + len(line) < size else start
+        return 0
+
+    @staticmethod
+    def _matches(entry, min_level, run_id):
+        if min_level is not None:
+            number = logging.getLevelName(entry["level"]) if entry["level"] else None
+            if not isinstance(number, int) or number < min_level:
+                return False
+        return run_id is None or run_id in entry["message"]
+
+    def end_cursor(self):
+        """Cursor pointing just past the last complete line of the current log."""
+        files = self.files()
+        if not files or files[0][0] != self.log_file:
+            return "0-0"
+        path, inode, size = files[0]
+        return f"{inode}-{self._complete_end(path, size)}"
+
+    def tail(self, limit=200, before=None, level=None, run_id=None):
+        """
+        Returns the last entries matching the filters.
+
+        Args:
+            limit (int): Maximum number of entries returned.
+            before (str): Cursor to page backwards from; defaults to the end of the log.
+            level (str): Minimum level, e.g. "WARNING".
+            run_id (str): Only entries mentioning this run (job) ID.
+
+        Returns:
+            dict: "entries" in log order, "before" (cursor for older entries, or
+            None once the start of the oldest backup is reached) and "after"
+            (cursor to read newer entries from with `since`).
+        """
+        min_level = level_number(level) if level else None
+        files = self.files()
+        if not files:
+            return {"entries": [], "before": None, "after": "0-0"}
+        if before is None:
+            after = self.end_cursor()
+            before = after if files[0][0] == self.log_file else f"{files[0][1]}-{files[0][2]}"
+        else:
+            after = before
+        index, position = self._locate(files, before)
+
+        entries, scanned = [], 0
+        while True:
+            path, inode, _ = files[index]
+            continuation = []
+            full = False
+            for start, raw in self._lines_backward(path, position):
+                scanned += len(raw) + 1
+                line = _decode(raw)
+                entry = parse_line(line)
+                if entry is None:
+                    continuation.insert(0, line)
+                    continue
+                position = start
+                if continuation:
+                    entry["message"] = "\n".join([entry["message"]] + continuation)
+                    continuation = []
+                if self._matches(entry, min_level, run_id):
+                    entries.append(entry)
+                if len(entries) >= limit or scanned >= self.max_scan_bytes:
+                    full = True
+                    break
+            if not full:
+                position = 0
+            if full or index == len(files) - 1:
+                break
+            index += 1
+            position = files[index][2]
+
+        at_start = index == len(files) - 1 and position == 0
+        entries.reverse()
+        return {
+            "entries": entries,
+            "before": None if at_start else f"{files[index][1]}-{position}",
+            "after": after,
+        }
+
+    def since(self, after, limit=1000, level=None, run_id=None):
+        """
+        Returns the entries written after a cursor, oldest first.
+
+        Args:
+            after (str): Cursor returned by `tail`, `since` or `end_cursor`.
+            limit (int): Maximum number of entries returned.
+            level (str): Minimum level, e.g. "WARNING".
+            run_id (str): Only entries mentioning this run (job) ID.
+
+        Returns:
+            dict: "entries" and "after", the cursor to continue from.
+        """
+        min_level = level_number(level) if level else None
+        files = self.files()
+        if not files:
+            return {"entries": [], "after": "0-0"}
+        index, position = self._locate(files, after)
+
+        entries, pending, scanned = [], None, 0
+        while True:
+            path, _, _ = files[index]
+            full = False
+            for start, raw in self._lines_forward(path, position):
+                line = _decode(raw)
+                entry = parse_line(line)
+                if entry is None:
+                    if pending is not None:
+                        pending["message"] += "\n" + line
+                    elif line.strip():
+                        pending = {"timestamp": None, "level": None, "message": line, "run_id": None}
+                else:
+                    if pending is not None and self._matches(pending, min_level, run_id):
+                        entries.append(pending)
+                    pending = None
+                    if len(entries) >= limit or scanned >= self.max_scan_bytes:
+                        position = start
+                        full = True
+                        break
+                    pending = entry
+                position = start + len(raw) + 1
+                scanned += len(raw) + 1
+            if full or index == 0:
+                break
+            # Finished a rotated file; continue with the next newer one
+            if pending is not None and self._matches(pending, min_level, run_id):
+                entries.append(pending)
+            pending = None
+            index -= 1
+            position = 0
+
+        if pending is not None and self._matches(pending, min_level, run_id):
+            entries.append(pending)
+        return {"entries": entries, "after": f"{files[index][1]}-{position}"}
+
+    def clear(self):
+        """Empties the current log file and removes its rotated backups."""
+        for path, _, _ in self.files():
+            if path == self.log_file:
+                with open(path, "w"):
+                    pass
+            else:
+                os.remove(path)
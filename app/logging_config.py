@@ -15,6 +15,10 @@ class CustomFormatter(logging.Formatter):
             return dt.strftime(datefmt)
         return dt.strftime("%Y-%m-%d %H:%M:%S")  # Default readable format
 
+def configure_console_logging(level=logging.INFO):
+    """Logs to stderr in processes without the dashboard's handlers: job workers and the CLI."""
+    logging.basicConfig(level=level, format="%(asctime)s [%(levelname)s] %(message)s", handlers=[logging.StreamHandler()])
+
 def configure_logging(app):
     log_file = app.config["LOG_FILE"]
     log_dir = os.path.dirname(log_file)
@@ -22,13 +26,16 @@ def configure_logging(app):
     if not os.path.exists(log_file):
         open(log_file, "w").close()
 
-    log_handler = RotatingFileHandler(log_file, maxBytes=100000, backupCount=10)
+    log_handler = RotatingFileHandler(
+        log_file, maxBytes=app.config["LOG_MAX_BYTES"], backupCount=app.config["LOG_BACKUP_COUNT"]
+    )
     log_handler.setLevel(logging.INFO)
     timezone = pytz.timezone("Europe/Brussels")  # Set Brussels timezone
     formatter = CustomFormatter('%(asctime)s - %(levelname)s - %(message)s', timezone=timezone)
     log_handler.setFormatter(formatter)
 
-    if not app.logger.handlers:
+    # Flask installs its own stderr handler, so look for an existing file handler instead
+    if not any(isinstance(handler, RotatingFileHandler) for handler in app.logger.handlers):
         app.logger.addHandler(log_handler)
         app.logger.setLevel(logging.INFO)
 
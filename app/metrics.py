@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the current process, or 0 if unknown."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+
+def rss_bytes():
+    """
+    Current resident set size of the process, or 0 if unknown. Unlike
+    `peak_rss_bytes` it does not carry the peak of earlier jobs run by the
+    same (reused) worker process.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class RunMetrics:
+    """
+    Per-stage measurements of one pipeline run: wall time, rows processed,
+    bytes read and the highest process RSS measured at the end of the stage
+    during this run.
+
+    A stage may be entered many times (e.g. once per chunk); its measurements
+    are accumulated.
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.stages = {}
+
+    def add(self, name, seconds=0.0, rows=0, bytes_read=0):
+        stage = self.stages.setdefault(
+            name, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes_read": 0, "peak_rss_bytes": 0}
+        )
+        stage["seconds"] += seconds
+        stage["calls"] += 1
+        stage["rows"] += rows
+        stage["bytes_read"] += bytes_read
+        stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"], rss_bytes())
+        return stage
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times a block as one call of stage `name`. The yielded dict can be used
+        to report `rows` and `bytes_read` for the block.
+        """
+        counts = {"rows": 0, "bytes_read": 0}
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(name, time.perf_counter() - start, counts["rows"], counts["bytes_read"])
+
+    def report(self):
+        return {"run_id": self.run_id, "started_at": self.started_at, "stages": self.stages}
+
+
+class MetricsStore:
+    """
+    Persists run reports so stages measured in worker processes show up in the
+    dashboard. Each run is written as `<run_id>.json` in `report_dir` and its
+    stages are added to an SQLite table used for the `/metrics` totals.
+
+    Runs older than `ttl` seconds, and all but the latest `max_runs` runs, are
+    removed from both whenever a run is saved. `/metrics` aggregates the runs of
+    the last `window` seconds.
+    """
+
+    def __init__(self, db_path, report_dir, ttl=30 * 24 * 3600, max_runs=1000, window=24 * 3600):
+        self.db_path = db_path
+        self.report_dir = report_dir
+        self.ttl = ttl
+        self.max_runs = max_runs
+        self.window = window
+        os.makedirs(report_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stage_metrics (
+                    run_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    seconds REAL NOT NULL,
+                    calls INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    bytes_read INTEGER NOT NULL,
+                    peak_rss_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS stage_metrics_created_at ON stage_metrics (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS stage_metrics_stage ON stage_metrics (stage, created_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def save(self, metrics):
+        """Writes the run's JSON report and records its stages."""
+        report = metrics.report()
+        path = os.path.join(self.report_dir, f"{metrics.run_id}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=4)
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO stage_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (metrics.run_id, name, stage["seconds"], stage["calls"], stage["rows"],
+                     stage["bytes_read"], stage["peak_rss_bytes"], now)
+                    for name, stage in report["stages"].items()
+                ],
+            )
+        self.purge()
+        return path
+
+    def purge(self):
+        """Removes the stages and reports of expired runs and of runs beyond `max_runs`."""
+        cutoff = time.time() - self.ttl
+        with self._connect() as conn:
+            conn.execute("DELETE FROM stage_metrics WHERE created_at < ?", (cutoff,))
+            conn.execute(
+                """
+                DELETE FROM stage_metrics WHERE run_id NOT IN (
+                    SELECT run_id FROM stage_metrics GROUP BY run_id ORDER BY MAX(created_at) DESC LIMIT ?
+                )
+                """,
+                (self.max_runs,),
+            )
+
+        reports = []
+        for entry in os.scandir(self.report_dir):
+            if entry.name.endswith(".json"):
+                try:
+                    reports.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        reports.sort(reverse=True)
+        for position, (modified, path) in enumerate(reports):
+            if position >= self.max_runs or modified < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load_report(self, run_id):
+        """Returns a saved run report, or None."""
+        path = os.path.join(self.report_dir, f"{os.path.basename(run_id)}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def prometheus(self):
+        """
+        Renders the totals per stage over the last `window` seconds in the
+        Prometheus text exposition format. Runs leave the window as it moves, so
+        the totals are gauges rather than counters.
+        """
+        since = time.time() - self.window
+        with self._connect() as conn:
+            totals = conn.execute(
+                """
+                SELECT stage, COUNT(*), SUM(seconds), SUM(rows), SUM(bytes_read), MAX(peak_rss_bytes)
+                FROM stage_metrics WHERE created_at >= ? GROUP BY stage ORDER BY stage
+                """,
+                (since,),
+            ).fetchall()
+            last = dict(conn.execute(
+                """
+                SELECT stage, seconds FROM stage_metrics AS m
+                WHERE created_at = (SELECT MAX(created_at) FROM stage_metrics WHERE stage = m.stage)
+                """
+            ).fetchall())
+
+        window = f"in the last {self.window} seconds"
+        metrics = [
+            ("etl_stage_runs_total", "gauge", f"Pipeline runs that went through the stage {window}.", 1),
+            ("etl_stage_seconds_total", "gauge", f"Wall time spent in the stage {window}.", 2),
+            ("etl_stage_rows_total", "gauge", f"Rows processed by the stage {window}.", 3),
+            ("etl_stage_bytes_read_total", "gauge", f"Bytes read by the stage {window}.", 4),
+            ("etl_stage_peak_rss_bytes", "gauge", f"Highest process RSS observed at the end of the stage {window}.", 5),
+        ]
+        lines = []
+        for name, kind, description, position in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{stage="{row[0]}"}} {row[position]}' for row in totals)
+        lines.append("# HELP etl_stage_last_seconds Wall time of the stage in the most recent run.")
+        lines.append("# TYPE etl_stage_last_seconds gauge")
+        lines.extend(f'etl_stage_last_seconds{{stage="{stage}"}} {seconds}' for stage, seconds in sorted(last.items()))
+        return "\n".join(lines) + "\n"
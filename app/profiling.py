@@ -0,0 +1,389 @@
+import math
+import re
+import numpy as np
+import pandas as pd
+from app.columnar import read_parsed_chunks
+
+# Bump whenever profiles or the schemas derived from them change, so cached profiles are not reused.
+PROFILE_VERSION = 4
+
+# Value patterns tried on string columns, in order of preference:
+# (name, regular expression, schema type, strptime format)
+PATTERNS = (
+    ("integer", r"[+-]?(?:0|[1-9][0-9]*)", "integer", None),
+    ("float", r"[+-]?(?:(?:0|[1-9][0-9]*)(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?", "float", None),
+    ("datetime", r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}", "date", "%Y-%m-%d %H:%M:%S"),
+    ("datetime_t", r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}", "date", "%Y-%m-%dT%H:%M:%S"),
+    ("date", r"[0-9]{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01])", "date", "%Y-%m-%d"),
+    ("date_slash", r"[0-9]{4}/(?:0[1-9]|1[0-2])/(?:0[1-9]|[12][0-9]|3[01])", "date", "%Y/%m/%d"),
+    ("date_dmy", r"(?:0[1-9]|[12][0-9]|3[01])/(?:0[1-9]|1[0-2])/[0-9]{4}", "date", "%d/%m/%Y"),
+    ("date_mdy", r"(?:0[1-9]|1[0-2])/(?:0[1-9]|[12][0-9]|3[01])/[0-9]{4}", "date", "%m/%d/%Y"),
+    ("date_dotted", r"(?:0[1-9]|[12][0-9]|3[01])\.(?:0[1-9]|1[0-2])\.[0-9]{4}", "date", "%d.%m.%Y"),
+    ("boolean", r"(?i:true|false|yes|no)", "string", None),
+    ("digits", r"[0-9]+", "string", None),  # Codes with leading zeros, e.g. ZIP codes
+    ("uuid", r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}", "string", None),
+    ("email", r"[^@\s]+@[^@\s]+\.[^@\s]+", "string", None),
+    ("url", r"https?://\S+", "string", None),
+)
+_REGEXES = {name: regex for name, regex, _, _ in PATTERNS}
+_PATTERN_TYPES = {name: (dtype, date_format) for name, _, dtype, date_format in PATTERNS}
+# Patterns whose unique columns are identifiers. Digit codes are left out: ZIP
+# and similar codes are often unique in small files without being keys
+KEY_PATTERNS = ("integer", "uuid", "email")
+_PROBE_VALUES = 100  # Distinct values patterns are tried on before the rest of a chunk
+
+
+class HyperLogLog:
+    """
+    Approximate distinct count of 64-bit hashes in `2 ** precision` one-byte
+    registers (16 KB by default, about 0.8% standard error).
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        """Adds an array of uint64 hashes."""
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = hashes << np.uint64(p)
+        # Position of the first set bit of the remaining bits; frexp is exact on 32-bit halves
+        high = np.frexp((rest >> np.uint64(32)).astype(np.float64))[1]
+        low = np.frexp((rest & np.uint64(0xFFFFFFFF)).astype(np.float64))[1]
+        bits = np.where(high > 0, high + 32, low)
+        rank = np.minimum(65 - bits, 64 - p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting is more accurate for small counts
+        return int(round(estimate))
+
+    @property
+    def error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+def _python(value):
+    """Converts numpy scalars and timestamps into plain JSON-friendly values."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+class _ColumnProfile:
+    """Running statistics of one column, updated chunk by chunk."""
+
+    def __init__(self, max_exact_distinct, max_examples, precision):
+        self.max_exact_distinct = max_exact_distinct
+        self.max_examples = max_examples
+        self.precision = precision
+        self.nulls = 0
+        self.present = 0
+        self.hashes = np.empty(0, dtype=np.uint64)  # Distinct value hashes while counting exactly
+        self.sketch = None  # HyperLogLog once there are too many distinct values
+        self.increasing = True  # Strictly increasing values are unique even without an exact count
+        self.last = None
+        self.kind = None  # "integer", "float", "boolean", "date" or "string"
+        self.minimum = self.maximum = None
+        self.comparable = True
+        self.min_length = self.max_length = None
+        self.patterns = [name for name, _, _, _ in PATTERNS]
+        self.examples = []
+
+    def update(self, values):
+        missing = values.isna()
+        present = values[~missing]
+        self.nulls += int(missing.sum())
+        self.present += len(present)
+        if present.empty:
+            return
+
+        kind = _value_kind(present)
+        if self.kind is None:
+            self.kind = kind
+        elif self.kind != kind:
+            # E.g. integers in one chunk and floats (or text) in another
+            self.kind = "float" if {self.kind, kind} == {"integer", "float"} else "string"
+        if kind in ("integer", "float"):
+            if kind == "float" and bool((present % 1 == 0).all()) and present.abs().max() < 2 ** 53:
+                present = present.astype("int64")  # Hashes like the integers of other chunks
+            self._update_range(present.min(), present.max())
+            self._update_order(present)
+        elif kind == "string":
+            present = present.astype(str)
+            lengths = present.str.len()
+            low, high = int(lengths.min()), int(lengths.max())
+            self.min_length = low if self.min_length is None else min(self.min_length, low)
+            self.max_length = high if self.max_length is None else max(self.max_length, high)
+            self._update_range(present.min(), present.max())
+            self._update_order(present)
+            self._update_patterns(present)
+        else:
+            self._update_range(present.min(), present.max())
+
+        self._update_distinct(pd.util.hash_pandas_object(present, index=False).to_numpy())
+        if len(self.examples) < self.max_examples:
+            for value in pd.unique(present.to_numpy())[: self.max_examples]:
+                value = _python(value)
+                if value not in self.examples and len(self.examples) < self.max_examples:
+                    self.examples.append(value)
+
+    def _update_range(self, low, high):
+        if not self.comparable:
+            return
+        if self.minimum is None:
+            self.minimum, self.maximum = low, high
+            return
+        try:
+            self.minimum, self.maximum = min(self.minimum, low), max(self.maximum, high)
+        except TypeError:  # Values of different kinds, e.g. numbers and text
+            self.minimum = self.maximum = None
+            self.comparable = False
+
+    def _update_order(self, present):
+        if not self.increasing:
+            return
+        values = present.to_numpy()
+        try:
+            self.increasing = bool((values[1:] > values[:-1]).all()) and (
+                self.last is None or values[0] > self.last
+            )
+        except TypeError:
+            self.increasing = False
+        self.last = values[-1]
+
+    def _update_patterns(self, present):
+        if not self.patterns:
+            return
+        distinct = pd.Series(pd.unique(present.to_numpy()), dtype=present.dtype)
+        # Most columns rule out most patterns on a handful of values
+        for values in (distinct.iloc[:_PROBE_VALUES], distinct.iloc[_PROBE_VALUES:]):
+            if values.empty:
+                continue
+            self.patterns = [
+                name for name in self.patterns if values.str.fullmatch(_REGEXES[name]).all()
+            ]
+            if not self.patterns:
+                return
+
+    def _update_distinct(self, hashes):
+        if self.sketch is not None:
+            self.sketch.add(hashes)
+            return
+        self.hashes = pd.unique(np.concatenate([self.hashes, hashes]))
+        if len(self.hashes) > self.max_exact_distinct:
+            self.sketch = HyperLogLog(self.precision)
+            self.sketch.add(self.hashes)
+            self.hashes = None
+
+    def result(self, rows):
+        if self.sketch is None:
+            exact, distinct = True, len(self.hashes)
+            unique = self.present > 0 and distinct == self.present
+        elif self.increasing:
+            exact, distinct, unique = True, self.present, True
+        else:
+            exact, distinct = False, min(self.sketch.count(), self.present)
+            unique = distinct >= self.present * (1 - 3 * self.sketch.error)
+        dtype, date_format, pattern = self._infer_type()
+        profile = {
+            "type": dtype,
+            "nulls": self.nulls,
+            "null_fraction": round(self.nulls / rows, 4) if rows else 0.0,
+            "distinct": int(distinct),
+            "distinct_exact": exact,
+            "unique": bool(unique),
+            "min": _python(self.minimum),
+            "max": _python(self.maximum),
+        }
+        if self.kind == "string":
+            profile["min_length"], profile["max_length"] = self.min_length, self.max_length
+        if pattern:
+            profile["pattern"] = pattern
+        if date_format:
+            profile["format"] = date_format
+        elif dtype is None and self.kind == "string":
+            # Several date formats fit every value, e.g. "01/02/2024"
+            profile["formats"] = [_PATTERN_TYPES[name][1] for name in self.patterns if _PATTERN_TYPES[name][1]]
+        profile["examples"] = self.examples
+        return profile
+
+    def _infer_type(self):
+        """Returns (schema type, date format, pattern name); the type is None when the values don't settle it."""
+        if self.kind in ("integer", "float"):
+            return self.kind, None, None
+        if self.kind == "boolean":
+            return "string", None, "boolean"
+        if self.kind == "date":
+            return "date", None, None
+        if self.kind is None:
+            return "string", None, None  # No values at all
+        if not self.patterns:
+            return "string", None, None
+        dates = [name for name in self.patterns if _PATTERN_TYPES[name][0] == "date"]
+        if len(dates) > 1 and self.patterns[0] in dates:
+            return None, None, None
+        name = self.patterns[0]
+        dtype, date_format = _PATTERN_TYPES[name]
+        return dtype, date_format, name
+
+
+
+def _value_kind(present):
+    if pd.api.types.is_bool_dtype(present):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(present):
+        return "integer"
+    if pd.api.types.is_float_dtype(present):
+        return "float"
+    if pd.api.types.is_datetime64_any_dtype(present):
+        return "date"
+    return "string"
+
+
+_KEY_NAME = re.compile(r"(^|[^a-z])(id|key)$")
+
+
+def _looks_like_key(name, column):
+    """
+    Whether a unique column is an identifier: an exact count (or one over the
+    profiled rows of a sampled file) and an identifier pattern or name.
+    """
+    return (column["distinct_exact"] or column.get("sampled", False)) and (
+        column.get("pattern", column["type"]) in KEY_PATTERNS or _KEY_NAME.search(name.lower()) is not None
+    )
+
+
+def _rank_key(name, column):
+    """Orders candidate keys: exact counts first, then identifier-like names and patterns."""
+    identifier = re.search(r"(^|[^a-z])(id|key|code)$", name.lower()) is not None
+    return (
+        not column["distinct_exact"],
+        not identifier,
+        column.get("pattern", column["type"]) not in KEY_PATTERNS,
+    )
+
+
+def profile_csv(file_path, chunksize=100000, max_examples=5, max_exact_distinct=100000, precision=14,
+                max_rows=None):
+    """
+    Computes per-column statistics of a CSV file in one streaming pass. Files
+    that were converted with `app.columnar.convert_csv` are read from that cache.
+
+    Each column gets its null count and fraction, the number of distinct values
+    (exact up to `max_exact_distinct`, a HyperLogLog estimate beyond), min/max
+    (and min/max length of text), the value pattern all its values match
+    (integer, float, several date formats, boolean, digits, uuid, email, url),
+    the schema type that follows from it and a few example values. Columns
+    without nulls whose values are all distinct are candidate keys.
+
+    With `max_rows`, only the first `max_rows` rows are profiled, so schema
+    inference on a large file does not parse all of it. If the file has more
+    rows, the profile is `sampled`: its counts describe the profiled rows only,
+    so no distinct count is marked exact and every column is marked `sampled`.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        chunksize (int): Number of rows read at a time.
+        max_examples (int): Distinct example values kept per column.
+        max_exact_distinct (int): Distinct values counted exactly per column.
+        precision (int): HyperLogLog precision; its registers take `2 ** precision` bytes.
+        max_rows (int, optional): Rows profiled at most; the whole file by default.
+
+    Returns:
+        dict: `rows` (profiled), `sampled`, `columns` (column name -> statistics)
+        and `candidate_keys`, best first. A column's `type` is None when its values fit several date
+        formats, which are listed in `formats`.
+    """
+    columns, rows, sampled = None, 0, False
+    if max_rows:
+        chunksize = min(chunksize, max_rows)
+    chunks = read_parsed_chunks(file_path, chunksize)
+    try:
+        for chunk in chunks:
+            if max_rows and rows >= max_rows:
+                sampled = True  # More rows than profiled
+                break
+            if max_rows and len(chunk) > max_rows - rows:
+                chunk, sampled = chunk.iloc[:max_rows - rows], True
+            if columns is None:
+                columns = {
+                    column: _ColumnProfile(max_exact_distinct, max_examples, precision) for column in chunk.columns
+                }
+            rows += len(chunk)
+            for column, profile in columns.items():
+                profile.update(chunk[column])
+            if sampled:
+                break
+    finally:
+        chunks.close()
+    if columns is None:
+        columns = {column: _ColumnProfile(max_exact_distinct, max_examples, precision)
+                   for column in pd.read_csv(file_path, nrows=0).columns}
+
+    results = {column: profile.result(rows) for column, profile in columns.items()}
+    if sampled:
+        for result in results.values():
+            result["distinct_exact"] = False
+            result["sampled"] = True
+    candidate_keys = sorted(
+        (column for column, result in results.items() if result["unique"] and result["nulls"] == 0 and rows > 1),
+        key=lambda column: _rank_key(column, results[column]),
+    )
+    return {"rows": rows, "sampled": sampled, "columns": results, "candidate_keys": candidate_keys}
+
+
+def target_name(column):
+    """Lower snake case column name, e.g. "OrderDate" -> "order_date", "Unit Price ($)" -> "unit_price"."""
+    name = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", str(column))
+    return re.sub(r"[^0-9a-zA-Z]+", "_", name).strip("_").lower() or "column"
+
+
+def schema_from_profile(profile):
+    """
+    Derives schema entries from a profile for the columns whose type it settles.
+
+    Names are the source names in snake case, `required` follows from the null
+    count (unless the profile is sampled, as later rows may have gaps), and the best candidate key that looks like an identifier (by its
+    pattern or a name ending in "id" or "key") becomes the primary key. Other
+    unique columns are only marked unique when they look like identifiers too,
+    since a small file makes many columns, e.g. ZIP codes, unique by chance.
+
+    Returns:
+        tuple: (schema mapping of the settled columns, list of the columns left
+        for the LLM).
+    """
+    schema, pending = {}, []
+    primary_key = next(
+        (column for column in profile["candidate_keys"] if _looks_like_key(column, profile["columns"][column])), None
+    )
+    names = set()
+    for column, stats in profile["columns"].items():
+        if stats["type"] is None:
+            pending.append(column)
+            continue
+        name = target_name(column)
+        while name in names:
+            name += "_"
+        names.add(name)
+        is_key = column in profile["candidate_keys"]
+        target = {
+            "name": name,
+            "type": stats["type"],
+            "constraints": {
+                "required": stats["nulls"] == 0 and profile["rows"] > 0 and not profile.get("sampled", False),
+                "unique": column == primary_key or (is_key and _looks_like_key(column, stats)),
+            },
+            "primary_key": column == primary_key,
+        }
+        if stats.get("format"):
+            target["format"] = stats["format"]
+        schema[column] = target
+    return schema, pending
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class SchemaCache:
+    """
+    Persistent on-disk cache of inferred schemas.
+
+    Entries are content-addressed: the key is a hash of the column names, the
+    column profiles, the model and the prompt version, so the same columns
+    never trigger a second LLM call. Column profiles are cached as well, keyed
+    by the file's content hash (see `make_profile_key`), so inferring the
+    schema of an unchanged file again skips the profiling pass too. Each entry is one JSON file in
+    `cache_dir`; its modification time is refreshed on every hit and the least
+    recently used entries are evicted once `max_entries` is exceeded.
+
+    Inference runs in job worker processes, so hits and misses are counted in
+    an SQLite file next to the entries, per kind of lookup ("schema" for LLM
+    replies, "profile" for column profiles), where every process adds to them.
+    """
+
+    def __init__(self, cache_dir, ttl=7 * 24 * 3600, max_entries=256):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache entries.
+            ttl (int): Seconds after which an entry is considered expired.
+            max_entries (int): Maximum number of entries kept on disk.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats_path = os.path.join(cache_dir, "stats.sqlite3")
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lookups (
+                    kind TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.stats_path, timeout=30)
+
+    def _count(self, kind, hit):
+        column = "hits" if hit else "misses"
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT INTO lookups (kind, {column}) VALUES (?, 1) "
+                    f"ON CONFLICT (kind) DO UPDATE SET {column} = {column} + 1",
+                    (kind,),
+                )
+        except sqlite3.Error as e:  # Counters must never fail a lookup
+            self.logger.warning(f"Could not update schema cache counters: {e}")
+
+    @staticmethod
+    def make_key(columns, sample_data, model, prompt_version):
+        """Returns the content hash identifying one inference request."""
+        payload = json.dumps(
+            {
+                "columns": list(columns),
+                "sample": sample_data,
+                "model": model,
+                "prompt_version": prompt_version,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_profile_key(content_hash, max_examples, local_types, profile_version, max_rows=None):
+        """Returns the key of the column profiles of one file content."""
+        payload = json.dumps(
+            {
+                "profile": content_hash,
+                "max_examples": max_examples,
+                "local_types": local_types,
+                "profile_version": profile_version,
+                "max_rows": max_rows,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key, allow_stale=False, kind="schema"):
+        """
+        Looks up a cached schema mapping.
+
+        Args:
+            key (str): Key returned by `make_key`.
+            allow_stale (bool): Return the entry even if its TTL has expired.
+                Stale lookups are not counted as hits or misses.
+            kind (str): Counters the lookup is added to: "schema" or "profile".
+
+        Returns:
+            dict or None: The cached schema mapping, or None if not cached.
+        """
+        path = self._path(key)
+        entry = None
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.warning(f"Discarding unreadable schema cache entry {key}: {e}")
+
+        expired = entry is None or time.time() - entry.get("created", 0) > self.ttl
+        if allow_stale:
+            return entry["schema"] if entry else None
+
+        self._count(kind, not expired)
+        if expired:
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return entry["schema"]
+
+    def set(self, key, schema_mapping):
+        """Stores a schema mapping and evicts the least recently used entries."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"created": time.time(), "schema": schema_mapping}, f, default=str)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    path = os.path.join(self.cache_dir, name)
+                    try:
+                        entries.append((os.path.getmtime(path), path))
+                    except OSError:
+                        continue
+            excess = len(entries) - self.max_entries
+            if excess <= 0:
+                return
+            for _, path in sorted(entries)[:excess]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.logger.info(f"Evicted {excess} schema cache entries.")
+
+    def clear(self):
+        """Removes every cached entry."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of all processes: `hits`/`misses` for LLM
+        replies, `profile_hits`/`profile_misses` for column profiles, and the
+        number of entries on disk.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT kind, hits, misses FROM lookups").fetchall()
+        counts = {kind: (hits, misses) for kind, hits, misses in rows}
+        entries = sum(1 for name in os.listdir(self.cache_dir) if name.endswith(".json"))
+        schema_hits, schema_misses = counts.get("schema", (0, 0))
+        profile_hits, profile_misses = counts.get("profile", (0, 0))
+        return {
+            "hits": schema_hits,
+            "misses": schema_misses,
+            "profile_hits": profile_hits,
+            "profile_misses": profile_misses,
+            "entries": entries,
+        }
@@ -0,0 +1,284 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+def schema_diff(before, after):
+    """
+    Column-level difference between two schema mappings.
+
+    Returns:
+        dict: `added` and `removed` source columns, and `changed` columns with
+        their definitions `before` and `after`.
+    """
+    before, after = before or {}, after or {}
+    return {
+        "added": [column for column in after if column not in before],
+        "removed": [column for column in before if column not in after],
+        "changed": {
+            column: {"before": before[column], "after": after[column]}
+            for column in after
+            if column in before and before[column] != after[column]
+        },
+    }
+
+
+class SessionStore:
+    """
+    SQLite-backed storage of dashboard sessions and their schema versions.
+
+    Session values (API key, destination database, uploaded file, ...) are kept
+    in one row per session; schemas live in their own table, one row per
+    version with its diff to the previous one, so they are only read by the
+    routes that need them. Like `JobStore`, every call opens its own
+    short-lived connection.
+
+    Values under `secret_keys` (the API key, the destination database with
+    its password) are never written to the database: they are kept in the
+    memory of this process only, so after a restart they have to be entered
+    again.
+    """
+
+    def __init__(self, db_path, ttl=30 * 24 * 3600, max_versions=50, secret_keys=("openai_api_key", "destination_db")):
+        """
+        Args:
+            db_path (str): SQLite database file.
+            ttl (int): Seconds after its last change at which a session is removed.
+            max_versions (int): Schema versions kept per session; older ones are dropped.
+            secret_keys (tuple): Session keys kept in memory instead of the database.
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_versions = max_versions
+        self.secret_keys = tuple(secret_keys)
+        self._secrets = {}  # Session ID -> secret values
+        self._secrets_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_versions (
+                    session_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    mapping TEXT NOT NULL,
+                    diff TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (session_id, version)
+                )
+                """
+            )
+            # Sessions saved by earlier versions still hold their secrets
+            for row in conn.execute("SELECT id, data FROM sessions").fetchall():
+                data = json.loads(row[1])
+                if any(key in data for key in self.secret_keys):
+                    conn.execute("UPDATE sessions SET data = ? WHERE id = ?", (json.dumps(self._public(data)), row[0]))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(32)
+
+    def _public(self, data):
+        return {key: value for key, value in data.items() if key not in self.secret_keys}
+
+    def load(self, session_id):
+        """Returns the values of a session, or None if it does not exist or has expired."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND updated_at > ?", (session_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        with self._secrets_lock:
+            return {**json.loads(row["data"]), **self._secrets.get(session_id, {})}
+
+    def save(self, session_id, data):
+        hidden = {key: data[key] for key in self.secret_keys if key in data}
+        with self._secrets_lock:
+            if hidden:
+                self._secrets[session_id] = hidden
+            else:
+                self._secrets.pop(session_id, None)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (session_id, json.dumps(self._public(data)), time.time()),
+            )
+
+    def delete(self, session_id):
+        with self._secrets_lock:
+            self._secrets.pop(session_id, None)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("DELETE FROM schema_versions WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self):
+        """Removes expired sessions and their schemas. Returns the number of sessions removed."""
+        cutoff = time.time() - self.ttl
+        with self._connect() as conn:
+            expired = [row["id"] for row in conn.execute("SELECT id FROM sessions WHERE updated_at <= ?", (cutoff,))]
+            conn.execute(
+                "DELETE FROM schema_versions WHERE session_id IN (SELECT id FROM sessions WHERE updated_at <= ?)",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (cutoff,))
+        with self._secrets_lock:
+            for session_id in expired:
+                self._secrets.pop(session_id, None)
+        return len(expired)
+
+    def save_schema(self, session_id, mapping, source):
+        """
+        Stores a schema as the session's next version, with its diff to the
+        latest one. Saving a schema identical to the latest version stores nothing.
+
+        Args:
+            session_id (str): Session the schema belongs to.
+            mapping (dict): Schema mapping.
+            source (str): Where it came from, e.g. "inferred", "edited" or "file".
+
+        Returns:
+            int: Version number of the schema.
+        """
+        with self._connect() as conn:
+            latest = conn.execute(
+                "SELECT version, mapping FROM schema_versions WHERE session_id = ? ORDER BY version DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            previous = json.loads(latest["mapping"]) if latest else None
+            if previous == mapping:
+                return latest["version"]
+            version = latest["version"] + 1 if latest else 1
+            conn.execute(
+                "INSERT INTO schema_versions VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, version, json.dumps(mapping), json.dumps(schema_diff(previous, mapping)), source,
+                 time.time()),
+            )
+            conn.execute(
+                "DELETE FROM schema_versions WHERE session_id = ? AND version <= ?",
+                (session_id, version - self.max_versions),
+            )
+        return version
+
+    def get_schema(self, session_id, version=None):
+        """
+        Returns one schema version of a session (the latest by default) as a
+        dict with `version`, `mapping`, `diff`, `source` and `created_at`, or None.
+        """
+        query = "SELECT * FROM schema_versions WHERE session_id = ?"
+        params = [session_id]
+        if version is not None:
+            query += " AND version = ?"
+            params.append(version)
+        with self._connect() as conn:
+            row = conn.execute(query + " ORDER BY version DESC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry.pop("session_id")
+        entry["mapping"] = json.loads(entry["mapping"])
+        entry["diff"] = json.loads(entry["diff"])
+        return entry
+
+    def schema_versions(self, session_id):
+        """Lists the schema versions of a session, newest first, with their diffs but without the mappings."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT version, diff, source, created_at FROM schema_versions WHERE session_id = ? "
+                "ORDER BY version DESC",
+                (session_id,),
+            ).fetchall()
+        return [{**dict(row), "diff": json.loads(row["diff"])} for row in rows]
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session values loaded from a `SessionStore`; `sid` is the ID the cookie carries."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """
+    Keeps Flask sessions in a `SessionStore`. The cookie only carries the
+    signed session ID, so its size no longer grows with what the session holds,
+    and the store is written only when a request changed the session.
+    """
+
+    salt = "server-side-session"
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("utf-8")
+            except BadSignature:
+                sid = None
+            data = self.store.load(sid) if sid else None
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=self.store.new_id(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        self.store.save(session.sid, dict(session))
+        if session.new:
+            self.store.purge_expired()
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode("utf-8"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
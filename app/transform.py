@@ -1,13 +1,25 @@
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text, BigInteger, Text
 import logging
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler()]
-)
+import io
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.util import Finalize
+from app.metrics import RunMetrics
+from app.db import engines, get_engine
+from app.columnar import find_cache, cache_columns, iter_cache, read_cache, row_group_rows
+from app.upload import load_metadata
+from app.validation import Quarantine
+from app.profiling import target_name
 
 def validate_schema_mapping(schema_mapping):
     """Validate the schema mapping structure."""
@@ -16,80 +28,749 @@ def validate_schema_mapping(schema_mapping):
             f"Invalid schema_mapping format. Expected a dictionary of dictionaries with 'name' and 'type' keys."
         )
 
-def map_data_type(dtype):
-    """Map target schema type to Pandas transformation."""
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"  # Arrow-backed strings take far less memory than Python objects
+except ImportError:
+    STRING_DTYPE = "object"
+
+CATEGORY_MAX_RATIO = 0.5  # String columns with at most this share of distinct values become categoricals
+_INTEGER_DTYPES = ("Int8", "Int16", "Int32", "Int64")
+
+def _to_integer(x):
+    """Casts to the smallest nullable integer dtype, so missing values don't turn the column into floats."""
+    numbers = pd.to_numeric(x, errors="coerce")
+    # Non-integral values and values outside the int64 range become missing,
+    # so validation quarantines them as invalid integers
+    integers = numbers.where((numbers % 1 == 0) & (numbers >= -(2 ** 63)) & (numbers < 2 ** 63))
+    low, high = integers.min(), integers.max()
+    for dtype in _INTEGER_DTYPES[:-1]:
+        bounds = np.iinfo(dtype.lower())
+        if bounds.min <= low and high <= bounds.max:
+            return integers.astype(dtype)
+    return integers.astype("Int64")
+
+def _to_string(x, categorical=False):
+    """
+    Casts to strings while keeping missing values missing. Low-cardinality
+    columns become categoricals when `categorical` is set.
+    """
+    if STRING_DTYPE == "object":
+        strings = x if pd.api.types.is_object_dtype(x) else x.where(x.isna(), x.astype(str)).astype(object)
+    else:
+        strings = x.astype(STRING_DTYPE)
+    if categorical and len(strings) and strings.nunique() <= CATEGORY_MAX_RATIO * len(strings):
+        return strings.astype("category")
+    return strings
+
+def map_data_type(dtype, date_format=None, categorical=False):
+    """
+    Map target schema type to Pandas transformation.
+
+    Integers use the smallest nullable `Int*` dtype that fits the values, strings
+    use `STRING_DTYPE` (or `category` when `categorical` is set and few values are
+    distinct), and dates are parsed with `date_format` when one is given instead
+    of guessing the format.
+    """
     type_mapping = {
-        "date": lambda x: pd.to_datetime(x, errors="coerce"),
-        "float": lambda x: pd.to_numeric(x, errors="coerce"),
-        "integer": lambda x: pd.to_numeric(x, errors="coerce", downcast="integer"),
-        "string": lambda x: x.astype(str),
+        "date": lambda x: pd.to_datetime(x, format=date_format, errors="coerce"),
+        "float": lambda x: pd.to_numeric(x, errors="coerce").astype("float64"),
+        "integer": _to_integer,
+        "string": lambda x: _to_string(x, categorical),
     }
     return type_mapping.get(dtype, lambda x: x)
 
-def transform_data(file_path, schema_mapping):
+UNIQUE_STRATEGIES = ("suffix", "drop", "keep_first", "reject")
+
+
+def _in_seen(series, seen):
+    """
+    Marks the values found in `seen`. Probes the set once per value, so a
+    chunk costs O(chunk); `series.isin(seen)` would hash the whole set again
+    for every chunk.
+    """
+    values = series.to_numpy(dtype=object)
+    return pd.Series(np.fromiter((value in seen for value in values), dtype=bool, count=len(values)), index=series.index)
+
+
+
+def resolve_duplicates(series, strategy="suffix", seen=None, sample_size=5):
+    """
+    Resolves duplicate values of a `unique` column in one vectorized pass.
+
+    Strategies:
+        - "suffix": rewrite every later occurrence of a value to "<value>_<row index>".
+        - "drop", "keep_first": keep the first occurrence and drop the later ones.
+        - "reject": raise a ValueError.
+
+    The first occurrence of a value is always kept as is, so a file gives the
+    same rows whether it is resolved at once or chunk by chunk (where earlier
+    chunks have already been emitted). Missing values are never treated as duplicates. A single aggregated warning
+    is logged instead of one line per duplicate row.
+
+    Args:
+        series (pd.Series): Column values.
+        strategy (str): One of `UNIQUE_STRATEGIES` ("keep-first" is accepted too).
+        seen (set, optional): Values already emitted by earlier chunks; rows
+            matching them count as duplicates as well.
+        sample_size (int): Number of offending values included in the log line.
+
+    Returns:
+        tuple: (resolved pd.Series, boolean pd.Series of rows to keep).
+    """
+    strategy = strategy.replace("-", "_")
+    if strategy not in UNIQUE_STRATEGIES:
+        raise ValueError(f"Unknown duplicate strategy '{strategy}'. Expected one of {UNIQUE_STRATEGIES}.")
+
+    keep = pd.Series(True, index=series.index)
+    present = series.notna()
+    duplicates = series.duplicated(keep="first")
+    if seen:
+        duplicates |= _in_seen(series, seen)
+    duplicates &= present
+    duplicate_count = int(duplicates.sum())
+    if duplicate_count == 0:
+        return series, keep
+
+    offending = series[duplicates].unique()
+    summary = (
+        f"Column {series.name} has {duplicate_count} duplicate rows across {len(offending)} distinct values "
+        f"(strategy: {strategy}). Sample: {list(offending[:sample_size])}"
+    )
+    if strategy == "reject":
+        raise ValueError(summary)
+    logging.warning(summary)
+
+    if strategy == "suffix":
+        suffixed = series[duplicates].astype(str) + "_" + series.index[duplicates].astype(str)
+        series = series.astype(object)
+        series[duplicates] = suffixed
+    else:
+        keep = ~duplicates
+    return series, keep
+
+
+# Checks telling whether a column already has the dtype its cast would produce
+_PARSED_DTYPE_CHECKS = {
+    "date": pd.api.types.is_datetime64_any_dtype,
+    "float": lambda x: x.dtype == "float64",
+    "string": lambda x: x.dtype == STRING_DTYPE,
+}
+
+
+class TransformPlan:
+    """
+    A schema mapping compiled into everything `transform_data` needs per file.
+
+    Building the plan validates the mapping and resolves, once, the columns to
+    parse, the dtypes and date columns handed to `pd.read_csv` (so most casts
+    happen while parsing), the remaining per-column casts and the constraint
+    checks. Plans are immutable and can be reused across files; `get_plan`
+    caches them by schema content.
+    """
+
+    def __init__(self, schema_mapping):
+        validate_schema_mapping(schema_mapping)
+        self.schema_mapping = schema_mapping
+        self.source_columns = list(schema_mapping)
+        self.rename = {src: target["name"] for src, target in schema_mapping.items()}
+        self.target_columns = list(self.rename.values())
+        self.types = {target["name"]: target["type"] for target in schema_mapping.values()}
+        self.dtypes = {src: STRING_DTYPE for src, target in schema_mapping.items() if target["type"] == "string"}
+        self.date_columns = [src for src, target in schema_mapping.items() if target["type"] == "date"]
+        self.date_formats = {
+            src: target["format"]
+            for src, target in schema_mapping.items()
+            if target["type"] == "date" and target.get("format")
+        }
+        self.required = [
+            target["name"] for target in schema_mapping.values() if target.get("constraints", {}).get("required", False)
+        ]
+        self.unique = {
+            target["name"]: target["constraints"].get("on_duplicate", "suffix")
+            for target in schema_mapping.values()
+            if target.get("constraints", {}).get("unique", False)
+        }
+        self.primary_key = get_primary_key(schema_mapping)
+        # Duplicate primary keys are quarantined; `unique` strategies never rewrite them
+        self.unique.pop(self.primary_key, None)
+        # A suffixed value no longer fits a non-string column; a chunk holding one
+        # would load as text into a column created from earlier, typed chunks
+        for column_name, strategy in self.unique.items():
+            if strategy == "suffix" and self.types[column_name] != "string":
+                logging.info(f"Duplicates of {column_name} ({self.types[column_name]}) are quarantined, not suffixed.")
+                self.unique[column_name] = "keep_first"
+        self.key_columns = list(self.unique) + [column for column in [self.primary_key] if column]
+        # Constrained columns are rewritten or filled later, which categoricals don't allow
+        self.categorical = [
+            target["name"]
+            for target in schema_mapping.values()
+            if target["type"] == "string" and target["name"] not in self.required + self.key_columns
+        ]
+        self.casts = {
+            target["name"]: map_data_type(
+                target["type"], target.get("format"), categorical=target["name"] in self.categorical
+            )
+            for target in schema_mapping.values()
+        }
+
+    def _present_columns(self, header):
+        """
+        Returns the mapped columns found in a file header. Missing ones are
+        logged; `_transform_frame` adds them as empty columns.
+        """
+        header = set(header)
+        for column in self.source_columns:
+            if column not in header:
+                logging.warning(f"Column {column} is missing in the CSV. Filling with NaN.")
+        return [column for column in self.source_columns if column in header]
+
+    def read_csv_kwargs(self, file_path):
+        """Returns the `pd.read_csv` arguments for one file. Only the header is read here."""
+        header = set(pd.read_csv(file_path, nrows=0).columns)
+        kwargs = {
+            "usecols": self._present_columns(header),
+            "dtype": {column: dtype for column, dtype in self.dtypes.items() if column in header},
+            "parse_dates": [column for column in self.date_columns if column in header],
+        }
+        date_formats = {column: fmt for column, fmt in self.date_formats.items() if column in header}
+        if date_formats:
+            kwargs["date_format"] = date_formats
+        return kwargs
+
+    def cache_columns(self, cache_path):
+        """
+        Returns the columns to read from a columnar cache file, or None if the
+        CSV has to be parsed instead because a string column was cached as
+        floats or booleans, which do not keep its original text.
+        """
+        columns = cache_columns(cache_path)
+        if any(column in columns and not columns[column] for column in self.dtypes):
+            return None
+        return self._present_columns(columns)
+
+    def cast(self, df, column_name, defer_categorical=False):
+        """
+        Casts a column unless parsing already produced the target dtype. With
+        `defer_categorical`, columns that may become categoricals are cast to
+        strings only; the caller decides on the whole column later.
+        """
+        column = df[column_name]
+        categorical = column_name in self.categorical
+        if categorical and defer_categorical:
+            return _to_string(column)
+        check = _PARSED_DTYPE_CHECKS.get(self.types[column_name])
+        if check is not None and check(column) and not categorical:
+            return column
+        return self.casts[column_name](column)
+
+
+_PLAN_CACHE = {}
+
+
+def get_plan(schema_mapping):
+    """Returns the compiled plan for a schema mapping, building it on first use."""
+    if isinstance(schema_mapping, TransformPlan):
+        return schema_mapping
+    key = json.dumps(schema_mapping, sort_keys=True)
+    plan = _PLAN_CACHE.get(key)
+    if plan is None:
+        plan = _PLAN_CACHE[key] = TransformPlan(schema_mapping)
+    return plan
+
+
+def _transform_frame(df, plan, seen_keys=None, metrics=None, quarantine=None):
+    """
+    Applies a compiled plan to a single DataFrame (a whole file or one chunk).
+
+    Args:
+        df (pd.DataFrame): Data as read with `plan.read_csv_kwargs`.
+        plan (TransformPlan): Compiled schema mapping.
+        seen_keys (dict, optional): Target column name -> set of values already
+            emitted by earlier chunks. Used to keep `unique` and `primary_key`
+            checks correct across chunk boundaries; updated in place.
+        metrics (RunMetrics, optional): Receives the "cast" and "constraints" stage timings.
+        quarantine (Quarantine, optional): Receives the rows failing a constraint.
+
+    Returns:
+        pd.DataFrame: Transformed DataFrame holding the rows that passed validation.
+    """
+    metrics = metrics or RunMetrics()
+    df, invalid = _cast_frame(df, plan, metrics)
+
+    with metrics.stage("constraints") as stage:
+        stage["rows"] = len(df)
+        df = _validate(df, plan, invalid, seen_keys, quarantine)
+    return df
+
+
+def _cast_frame(df, plan, metrics, defer_categorical=False):
+    """
+    Adds missing mapped columns, renames them to their targets and casts them; see `TransformPlan.cast`.
+
+    Returns:
+        tuple: The cast DataFrame and a DataFrame holding the original values
+        the casts could not parse, missing elsewhere (one column per target
+        column that had any).
+    """
+    # Mapped columns missing from the CSV are added with NaN values
+    for col in plan.source_columns:
+        if col not in df.columns:
+            df[col] = pd.NA
+
+    # Rename columns based on schema mapping
+    df = df.rename(columns=plan.rename)
+
+    # Apply the data type casts that parsing did not already do
+    invalid = {}
+    with metrics.stage("cast") as stage:
+        for column_name in plan.target_columns:
+            original = df[column_name]
+            df[column_name] = plan.cast(df, column_name, defer_categorical)
+            failed = original.notna() & df[column_name].isna()
+            if failed.any():
+                invalid[column_name] = original.astype(object).where(failed)
+        stage["rows"] = len(df)
+    return df, pd.DataFrame(invalid, index=df.index)
+
+
+def _validate(df, plan, invalid, seen_keys, quarantine):
+    """
+    Evaluates every constraint as a boolean mask over the rows and moves the
+    rows failing any of them to `quarantine`, together with the reasons
+    (and with the original text of the values that could not be parsed):
+    values the cast could not parse, missing values of required columns,
+    missing or duplicate primary keys, and duplicates of `unique` columns whose
+    strategy drops rows ("drop", "keep_first"). The "suffix" strategy rewrites
+    duplicates of string columns and keeps them (other columns fall back to
+    "keep_first", see `TransformPlan`); "reject" still raises. Duplicates are only
+    looked for among the rows that passed the earlier checks.
+
+    Key checks need every earlier row, either in `df` or summarized in
+    `seen_keys`, so this runs once over the merged data, or per chunk in file order.
+
+    Returns:
+        pd.DataFrame: The rows that passed.
+    """
+    failures = [
+        (f"invalid {plan.types[column_name]} in {column_name}", invalid[column_name].notna())
+        for column_name in invalid.columns
+    ]
+    failures += [(f"missing {column_name}", df[column_name].isna()) for column_name in plan.required]
+
+    # Keys are only checked among the rows that passed the checks above, so a
+    # rejected row neither claims a key nor turns a later one into a duplicate
+    eligible = np.ones(len(df), dtype=bool)
+    for _, mask in failures:
+        eligible &= ~mask.to_numpy(dtype=bool)
+    if plan.primary_key:
+        column_name = plan.primary_key
+        keys = df[column_name]
+        missing = keys.isna().to_numpy(dtype=bool)
+        eligible &= ~missing
+        duplicate = np.zeros(len(df), dtype=bool)
+        duplicate[eligible] = keys[eligible].duplicated().to_numpy(dtype=bool)
+        seen = seen_keys.get(column_name) if seen_keys is not None else None
+        if seen:
+            duplicate[eligible] |= _in_seen(keys[eligible], seen).to_numpy(dtype=bool)
+        eligible &= ~duplicate
+        if seen is not None:
+            seen.update(keys[eligible].unique())
+        failures += [
+            (f"missing primary key {column_name}", pd.Series(missing, index=df.index)),
+            (f"duplicate primary key {column_name}", pd.Series(duplicate, index=df.index)),
+        ]
+
+    for column_name, strategy in plan.unique.items():
+        seen = seen_keys.get(column_name) if seen_keys is not None else None
+        resolved, keep = resolve_duplicates(df.loc[eligible, column_name], strategy, seen)
+        if resolved.dtype != df[column_name].dtype:
+            df[column_name] = df[column_name].astype(object)
+        df.loc[eligible, column_name] = resolved
+        dropped = np.zeros(len(df), dtype=bool)
+        dropped[eligible] = ~keep.to_numpy(dtype=bool)
+        failures.append((f"duplicate {column_name}", pd.Series(dropped, index=df.index)))
+        if seen is not None:
+            seen.update(resolved.dropna().unique())
+        eligible &= ~dropped
+
+    failures = [(reason, mask.to_numpy(dtype=bool)) for reason, mask in failures if mask.any()]
+    if not failures:
+        return df
+    failed = np.logical_or.reduce([mask for _, mask in failures])
+    reasons = pd.Series("", index=df.index[failed], dtype=object)
+    for reason, mask in failures:
+        hit = mask[failed]
+        reasons[hit] = reasons[hit] + "; " + reason
+    if quarantine is not None:
+        rejected = df[failed].astype({column_name: object for column_name in invalid.columns})
+        for column_name in invalid.columns:
+            raw = invalid[column_name][failed]
+            rejected[column_name] = rejected[column_name].where(raw.isna(), raw)
+        quarantine.add(rejected, reasons.str[2:])
+    return df[~failed]
+
+
+def _read_source(file_path, plan, chunksize=None):
+    """
+    Reads the mapped columns of a file, from its columnar cache (see
+    `app.columnar.convert_csv`) when it has a usable one.
+
+    Returns:
+        tuple: The data (a DataFrame, or an iterator of DataFrames when
+        `chunksize` is set) and the size in bytes of the file it is read from.
+    """
+    cache = find_cache(file_path)
+    columns = plan.cache_columns(cache) if cache else None
+    if columns is not None:
+        logging.info(f"Reading {file_path} from its columnar cache {cache}.")
+        if chunksize:
+            data = iter_cache(cache, chunksize, columns=columns, string_dtype=STRING_DTYPE, nullable_integers=True)
+        else:
+            data = read_cache(cache, columns=columns, string_dtype=STRING_DTYPE, nullable_integers=True)
+        return data, os.path.getsize(cache)
+    if chunksize:
+        data = pd.read_csv(file_path, chunksize=chunksize, **plan.read_csv_kwargs(file_path))
+    else:
+        data = pd.read_csv(file_path, **plan.read_csv_kwargs(file_path))
+    return data, os.path.getsize(file_path)
+
+
+def _iter_transformed_chunks(file_path, plan, chunksize, metrics, quarantine):
+    """Yields transformed chunks of `chunksize` rows from the input CSV."""
+    try:
+        # Values of unique/primary key columns seen so far, so duplicates spanning
+        # two chunks are still detected. This is the only state kept between chunks.
+        seen_keys = {column: set() for column in plan.key_columns}
+        total_rows = 0
+        reader, source_bytes = _read_source(file_path, plan, chunksize)
+        try:
+            chunks = iter(reader)
+            chunk_number = 0
+            while True:
+                with metrics.stage("read") as stage:
+                    chunk = next(chunks, None)
+                    stage["rows"] = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
+                chunk_number += 1
+                chunk = _transform_frame(chunk, plan, seen_keys, metrics, quarantine)
+                total_rows += len(chunk)
+                logging.debug(f"Transformed chunk {chunk_number} of {file_path}, shape: {chunk.shape}")
+                yield chunk
+        finally:
+            reader.close()
+        metrics.add("read", bytes_read=source_bytes)
+
+        quarantine.log_summary(file_path)
+        logging.info(f"Streaming transformation completed successfully. Rows processed: {total_rows}")
+
+    except Exception as e:
+        logging.error(f"Error during transformation: {e}")
+        raise
+
+
+PARTITIONS_PER_WORKER = 4  # Partitions per worker when a whole file is transformed in parallel
+_SAMPLE_BYTES = 1024 * 1024  # Bytes used to estimate the row size of a CSV file
+_MIN_PARTITION_BYTES = 64 * 1024
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """Returns the process pool of parallel transforms, created on first use and kept for later runs."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pool_workers = workers
+            # Must run before the finalizers of the pool's own queues (priority 10)
+            # close them, or the workers never receive the shutdown signal
+            Finalize(_pool, _pool.shutdown, exitpriority=20)
+        return _pool
+
+
+def _discard_pool():
+    """Drops a pool whose workers died, so the next run starts a new one."""
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _splittable(file_path):
+    """Whether a CSV file can be split at any line break, i.e. no quoted value spans lines."""
+    metadata = load_metadata(file_path)
+    if metadata and "multiline_records" in metadata and metadata.get("stored_bytes") == os.path.getsize(file_path):
+        return not metadata["multiline_records"]
+    # Not uploaded through the dashboard: only files without quotes are known to be safe
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return True
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return data.find(b'"') == -1
+
+
+def _csv_ranges(file_path, target_rows, count):
+    """
+    Splits the rows of a CSV file into byte ranges that start and end at line
+    breaks, either of about `target_rows` rows (estimated from the first
+    lines) or `count` ranges of equal size.
+
+    Returns:
+        tuple: The header line (bytes) and a list of (start, end) offsets.
+    """
+    with open(file_path, "rb") as f:
+        header = f.readline()
+        start, total = f.tell(), os.fstat(f.fileno()).st_size
+        if target_rows:
+            sample = f.read(_SAMPLE_BYTES)
+            size = len(sample) // max(sample.count(b"\n"), 1) * target_rows
+        else:
+            size = -(-(total - start) // count)
+        size = max(size, _MIN_PARTITION_BYTES)
+        ranges = []
+        while start < total:
+            f.seek(min(start + size, total) - 1)
+            f.readline()
+            ranges.append((start, f.tell()))
+            start = f.tell()
+    return header, ranges
+
+
+def _row_group_partitions(sizes, target_rows):
+    """Groups consecutive row groups of a cache file into partitions of at least `target_rows` rows."""
+    partitions, current, rows = [], [], 0
+    for index, size in enumerate(sizes):
+        current.append(index)
+        rows += size
+        if rows >= target_rows:
+            partitions.append(current)
+            current, rows = [], 0
+    if current:
+        partitions.append(current)
+    return partitions
+
+
+def _plan_partitions(file_path, plan, workers, target_rows=None):
+    """
+    Splits a file into partitions that workers read independently: row groups
+    of its columnar cache when it has a usable one, else byte ranges of the CSV.
+
+    Returns:
+        dict or None: `tasks` (arguments of `_transform_partition`), `source`
+        and `bytes` (size of the file read), or None if the file cannot be
+        split (fewer than two partitions, or quoted values spanning lines).
+    """
+    cache = find_cache(file_path)
+    columns = plan.cache_columns(cache) if cache else None
+    if columns is not None:
+        sizes = row_group_rows(cache)
+        target_rows = target_rows or -(-sum(sizes) // (workers * PARTITIONS_PER_WORKER))
+        partitions = _row_group_partitions(sizes, max(target_rows, 1))
+        tasks = [("cache", cache, groups, {"columns": columns}) for groups in partitions]
+        source = cache
+    else:
+        if not _splittable(file_path):
+            logging.info(f"{file_path} has quoted values spanning lines; it is transformed in a single process.")
+            return None
+        header, ranges = _csv_ranges(file_path, target_rows, workers * PARTITIONS_PER_WORKER)
+        read_kwargs = plan.read_csv_kwargs(file_path)
+        tasks = [("csv", file_path, (header, start, end), read_kwargs) for start, end in ranges]
+        source = file_path
+    if len(tasks) < 2:
+        return None
+    return {"tasks": tasks, "source": source, "bytes": os.path.getsize(source)}
+
+
+def _transform_partition(kind, path, partition, read_kwargs, schema_mapping, defer_categorical):
+    """
+    Worker side of a parallel transform: reads one partition and applies the
+    row-local part of the plan, i.e. the casts. Constraints are validated by
+    the caller, in file order.
+
+    Returns:
+        tuple: The partition DataFrame, the values its casts could not parse
+        (see `_cast_frame`) and its stage measurements.
+    """
+    plan = get_plan(schema_mapping)
+    metrics = RunMetrics()
+    with metrics.stage("read") as stage:
+        if kind == "cache":
+            df = read_cache(
+                path, string_dtype=STRING_DTYPE, nullable_integers=True, row_groups=partition, **read_kwargs
+            )
+        else:
+            header, start, end = partition
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+            df = pd.read_csv(io.BytesIO(header + data), **read_kwargs)
+        stage["rows"] = len(df)
+    df, invalid = _cast_frame(df, plan, metrics, defer_categorical)
+    return df, invalid, metrics.stages
+
+
+def _run_partitions(partitions, plan, workers, metrics, defer_categorical=False):
+    """
+    Transforms partitions in the process pool and yields them, with their
+    unparsable values, in file order, whatever order the workers finish in. At most two partitions per worker
+    are in flight, so memory stays bounded for large files.
+    """
+    pool = _get_pool(workers)
+    tasks = iter(partitions["tasks"])
+    pending = deque()
+
+    def submit():
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(pool.submit(_transform_partition, *task, plan.schema_mapping, defer_categorical))
+
+    try:
+        for _ in range(2 * workers):
+            submit()
+        while pending:
+            df, invalid, stages = pending.popleft().result()
+            submit()
+            for name, stage in stages.items():
+                metrics.add(name, stage["seconds"], stage["rows"], stage["bytes_read"])
+            yield df, invalid
+    except BrokenProcessPool:
+        _discard_pool()
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+    metrics.add("read", bytes_read=partitions["bytes"])
+
+
+def _iter_parallel_chunks(file_path, plan, partitions, workers, chunksize, metrics, quarantine):
+    """Parallel counterpart of `_iter_transformed_chunks`; keys are checked in file order in this process."""
+    try:
+        seen_keys = {column: set() for column in plan.key_columns}
+        total_rows = start = 0
+        for partition, invalid in _run_partitions(partitions, plan, workers, metrics):
+            partition.index = invalid.index = pd.RangeIndex(start, start + len(partition))
+            start += len(partition)
+            for offset in range(0, len(partition), chunksize):
+                if len(partition) <= chunksize:
+                    chunk, chunk_invalid = partition, invalid
+                else:
+                    chunk = partition.iloc[offset:offset + chunksize].copy()
+                    chunk_invalid = invalid.iloc[offset:offset + chunksize]
+                with metrics.stage("constraints") as stage:
+                    stage["rows"] = len(chunk)
+                    chunk = _validate(chunk, plan, chunk_invalid, seen_keys, quarantine)
+                total_rows += len(chunk)
+                yield chunk
+
+        quarantine.log_summary(file_path)
+        logging.info(f"Parallel streaming transformation completed successfully. Rows processed: {total_rows}")
+
+    except Exception as e:
+        logging.error(f"Error during transformation: {e}")
+        raise
+
+
+def _transform_parallel(file_path, plan, partitions, workers, metrics, quarantine):
+    """Transforms a whole file in parallel and merges the partitions into one DataFrame."""
+    frames, masks = zip(*_run_partitions(partitions, plan, workers, metrics, defer_categorical=True))
+    with metrics.stage("merge") as stage:
+        df = pd.concat(frames, ignore_index=True)
+        invalid = pd.concat(masks, ignore_index=True)
+        stage["rows"] = len(df)
+        # Decisions that depend on the whole column: the smallest integer dtype
+        # (partitions may have picked different ones) and categoricals
+        for column_name, dtype in plan.types.items():
+            if dtype == "integer" and len({str(frame[column_name].dtype) for frame in frames}) > 1:
+                df[column_name] = _to_integer(df[column_name])
+        for column_name in plan.categorical:
+            df[column_name] = _to_string(df[column_name], categorical=True)
+    del frames, masks
+    with metrics.stage("constraints") as stage:
+        stage["rows"] = len(df)
+        df = _validate(df, plan, invalid, None, quarantine)
+    return df
+
+
+def transform_data(file_path, schema_mapping, chunksize=None, metrics=None, workers=1, quarantine=None):
     """
     Transforms the input CSV data based on the provided schema mapping.
 
+    Only the mapped columns are parsed, and string and date columns are typed
+    while parsing. Files converted with `app.columnar.convert_csv` are read
+    from that columnar cache instead of being parsed again. The mapping is compiled into a `TransformPlan` that is cached
+    and reused for later files with the same schema.
+
+    When `chunksize` is given the file is streamed instead of being loaded at
+    once: a generator of transformed DataFrames of at most `chunksize` rows is
+    returned, so the data held at once is bounded by the chunk size rather
+    than the file size. The values of `unique` and `primary_key` columns seen
+    so far are the exception: they are kept in memory for the whole run, one
+    set entry per distinct key. Duplicates of `unique` and `primary_key`
+    columns are detected across the whole file; the first occurrence of a
+    value is kept, so the rows do not depend on the chunk size.
+
+    Rows failing a constraint (unparsable values, missing required values,
+    missing or duplicate primary keys, dropped duplicates) are not returned
+    but handed to `quarantine` with the reasons, so one bad row neither fails
+    the run nor changes the dtype of a column.
+
+    With `workers` > 1 the file is split into partitions (byte ranges aligned
+    to line breaks, or row groups of the columnar cache) that a process pool
+    reads, casts and fills in parallel. Partitions are merged in file order
+    and `unique`/`primary_key` constraints are then checked in one pass over
+    the merged rows, so the output does not depend on which worker finished
+    first. CSV files with quoted values spanning lines, and files too small to
+    split, are transformed in this process.
+
     Args:
         file_path (str): Path to the input CSV file.
-        schema_mapping (dict): Mapping of source columns to target schema.
+        schema_mapping (dict or TransformPlan): Mapping of source columns to
+            target schema, or a plan compiled from one.
+        chunksize (int, optional): Number of rows per chunk in streaming mode.
+        metrics (RunMetrics, optional): Receives the "read", "cast" and
+            "constraints" stage timings (summed over workers when run in parallel).
+        workers (int): Processes used to transform the file; see `Config.TRANSFORM_WORKERS`.
+        quarantine (Quarantine, optional): Receives the rejected rows; by
+            default they are only counted and logged.
 
     Returns:
-        pd.DataFrame: Transformed DataFrame.
+        pd.DataFrame: Transformed DataFrame, or an iterator of transformed
+        DataFrames when `chunksize` is set.
     """
     try:
-        # Validate schema mapping
-        validate_schema_mapping(schema_mapping)
+        # Validate and compile the schema mapping
+        plan = get_plan(schema_mapping)
         logging.info("Schema mapping validated.")
+        metrics = metrics or RunMetrics()
+        quarantine = quarantine if quarantine is not None else Quarantine()
+
+        partitions = _plan_partitions(file_path, plan, workers, chunksize) if workers > 1 else None
+        if partitions is not None:
+            logging.info(f"Transforming {file_path} in {len(partitions['tasks'])} partitions with {workers} workers.")
+            if chunksize:
+                return _iter_parallel_chunks(file_path, plan, partitions, workers, chunksize, metrics, quarantine)
+            df = _transform_parallel(file_path, plan, partitions, workers, metrics, quarantine)
+            quarantine.log_summary(file_path)
+            logging.info(f"Transformation completed successfully. Final data shape: {df.shape}")
+            return df
 
-        # Load the CSV file
-        df = pd.read_csv(file_path)
+        if chunksize:
+            logging.info(f"Streaming data from {file_path} in chunks of {chunksize} rows.")
+            return _iter_transformed_chunks(file_path, plan, chunksize, metrics, quarantine)
+
+        # Load the mapped columns of the CSV file
+        with metrics.stage("read") as stage:
+            df, stage["bytes_read"] = _read_source(file_path, plan)
+            stage["rows"] = len(df)
         logging.info(f"Loaded data from {file_path}, shape: {df.shape}")
 
-        # Handle missing columns by adding them with NaN values
-        for col in schema_mapping.keys():
-            if col not in df.columns:
-                logging.warning(f"Column {col} is missing in the CSV. Filling with NaN.")
-                df[col] = pd.NA
-
-        # Rename columns based on schema mapping
-        df.rename(columns={src: target["name"] for src, target in schema_mapping.items()}, inplace=True)
-
-        # Handle schema constraints and transformations
-        for target_column, target_info in schema_mapping.items():
-            column_name = target_info["name"]
-            dtype = target_info["type"]
-            constraints = target_info.get("constraints", {})
-
-            # Apply data type mapping
-            df[column_name] = map_data_type(dtype)(df[column_name])
-
-            # Handle required fields
-            if constraints.get("required", False):
-                missing_count = df[column_name].isna().sum()
-                if missing_count > 0:
-                    logging.warning(f"Column {column_name} has {missing_count} missing values.")
-                    df[column_name].fillna("MISSING", inplace=True)  # Default fill value for missing required fields
-                    logging.info(f"Filled missing values in {column_name} with 'MISSING'.")
-
-            # Handle unique constraints 
-            if constraints.get("unique", False):
-                duplicates = df[column_name].duplicated(keep=False)
-                if duplicates.any():
-                    duplicate_indices = df[duplicates].index
-                    for i in duplicate_indices:
-                        new_value = f"{df.loc[i, column_name]}_{i}"
-                        logging.warning(
-                            f"Duplicate value found in column {column_name} at row {i}. Rewriting to {new_value}."
-                        )
-                        df.at[i, column_name] = new_value
-
-            # Handle primary key constraints 
-            if target_info.get("primary_key", False):
-                if df[column_name].isna().any():
-                    raise ValueError(f"Primary key column {column_name} contains missing values.")
-                if df[column_name].duplicated().any():
-                    raise ValueError(f"Primary key column {column_name} contains duplicate values.")
+        df = _transform_frame(df, plan, metrics=metrics, quarantine=quarantine)
+        quarantine.log_summary(file_path)
 
         # Log the final transformation summary
         logging.info(f"Transformation completed successfully. Final data shape: {df.shape}")
@@ -100,19 +781,385 @@ def transform_data(file_path, schema_mapping):
         raise
 
 
-def load_data_to_postgres(df, table_name, connection_uri):
+def memory_report(file_path, schema_mapping, nrows=100000):
+    """
+    Compares per-column memory of a plain `pd.read_csv` with the typed columns
+    produced by `transform_data`, on the first `nrows` rows.
+
+    Returns:
+        pd.DataFrame: One row per target column with dtypes and bytes before and
+        after, and the reduction factor; the last row holds the totals.
+    """
+    plan = get_plan(schema_mapping)
+    before = pd.read_csv(file_path, nrows=nrows, usecols=plan.read_csv_kwargs(file_path)["usecols"])
+    before = before.rename(columns=plan.rename)
+    after = _transform_frame(pd.read_csv(file_path, nrows=nrows, **plan.read_csv_kwargs(file_path)), plan)
+
+    rows = []
+    for column in plan.target_columns:
+        before_bytes = int(before[column].memory_usage(index=False, deep=True)) if column in before else 0
+        after_bytes = int(after[column].memory_usage(index=False, deep=True))
+        rows.append({
+            "column": column,
+            "before_dtype": str(before[column].dtype) if column in before else None,
+            "after_dtype": str(after[column].dtype),
+            "before_bytes": before_bytes,
+            "after_bytes": after_bytes,
+        })
+    report = pd.DataFrame(rows)
+    totals = {"column": "TOTAL", "before_bytes": report["before_bytes"].sum(), "after_bytes": report["after_bytes"].sum()}
+    report = pd.concat([report, pd.DataFrame([totals])], ignore_index=True)
+    report["reduction"] = report["before_bytes"] / report["after_bytes"].where(report["after_bytes"] > 0)
+    logging.info(
+        f"Memory for {len(after)} rows of {file_path}: {totals['before_bytes']} bytes before, "
+        f"{totals['after_bytes']} bytes after typing."
+    )
+    return report
+
+
+ROW_HASH_COLUMN = "_row_hash"
+LOAD_MODES = ("replace", "upsert")
+
+
+def get_primary_key(schema_mapping):
+    """Returns the target name of the schema's primary key column, or None."""
+    for target in schema_mapping.values():
+        if target.get("primary_key", False):
+            return target["name"]
+    return None
+
+
+def get_unique_columns(schema_mapping):
+    """Returns the target names of the schema's `unique` columns."""
+    return [
+        target["name"] for target in schema_mapping.values() if target.get("constraints", {}).get("unique", False)
+    ]
+
+
+MAX_IDENTIFIER_LENGTH = 63  # PostgreSQL truncates longer names
+
+
+def table_name_for(file_path):
+    """Destination table of a file: its name without extension in snake case, e.g. "Sales 2024.csv" -> "sales_2024"."""
+    name = target_name(os.path.splitext(os.path.basename(file_path))[0])
+    if name[0].isdigit():
+        name = f"t_{name}"
+    return name[:MAX_IDENTIFIER_LENGTH]
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _copy_buffer(cursor, target, keys, buffer):
+    """Sends a CSV buffer to `target` with a single COPY FROM STDIN."""
+    buffer.seek(0)
+    columns = ", ".join(_quote(key) for key in keys)
+    cursor.copy_expert(f"COPY {target} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _sql_dtypes(df):
+    """
+    Column types for newly created tables. Integer chunks are downcast to the
+    smallest dtype that fits and strings may be categoricals, so the table is
+    created with BIGINT and TEXT rather than types that a later chunk overflows.
+    """
+    sql_dtypes = {}
+    for column in df.columns:
+        if pd.api.types.is_integer_dtype(df[column]):
+            sql_dtypes[column] = BigInteger()
+        elif isinstance(df[column].dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(df[column]):
+            sql_dtypes[column] = Text()
+    return sql_dtypes
+
+
+def _row_hashes(df):
+    """Per-row content hashes, used to skip rows that did not change since the last load."""
+    return pd.util.hash_pandas_object(df.astype(str), index=False).values.view("int64")
+
+
+def _has_unique_key(inspector, table_name, column):
+    """Whether a primary key, unique constraint or full unique index covers exactly `column`."""
+    keys = [inspector.get_pk_constraint(table_name)["constrained_columns"]]
+    keys += [constraint["column_names"] for constraint in inspector.get_unique_constraints(table_name)]
+    keys += [
+        index["column_names"] for index in inspector.get_indexes(table_name)
+        if index["unique"] and not index.get("dialect_options", {}).get("postgresql_where")
+    ]
+    return [column] in keys
+
+
+def _prepare_upsert(conn, chunk, table_name, primary_key, stage_name):
+    """Creates the target table if needed, ensures the conflict target exists and creates the staging table."""
+    target = _quote(table_name)
+    inspector = inspect(conn)
+    if not inspector.has_table(table_name):
+        chunk.head(0).to_sql(table_name, conn, index=False, dtype=_sql_dtypes(chunk))
+        logging.info(f"Created table '{table_name}' for incremental loads.")
+    if ROW_HASH_COLUMN in chunk.columns:
+        conn.execute(text(f"ALTER TABLE {target} ADD COLUMN IF NOT EXISTS {_quote(ROW_HASH_COLUMN)} BIGINT"))
+    # ON CONFLICT needs a unique index on the key column; a replace load already made it the primary key
+    if not _has_unique_key(inspector, table_name, primary_key):
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'{table_name}_{primary_key}_key')} "
+            f"ON {target} ({_quote(primary_key)})"
+        ))
+    conn.execute(text(
+        f"CREATE TEMP TABLE {_quote(stage_name)} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+
+
+def _upsert_chunk(conn, chunk, table_name, primary_key, stage_name):
+    """
+    Stages one chunk with COPY and merges it into the target table.
+
+    Returns:
+        int: Number of rows inserted or updated.
+    """
+    target, stage = _quote(table_name), _quote(stage_name)
+    columns = [str(column) for column in chunk.columns]
+    column_list = ", ".join(_quote(column) for column in columns)
+
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    conn.execute(text(f"TRUNCATE {stage}"))
+    with conn.connection.cursor() as cursor:
+        _copy_buffer(cursor, stage, columns, buffer)
+
+    updates = ", ".join(f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in columns if column != primary_key)
+    merge = (
+        f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {stage} "
+        f"ON CONFLICT ({_quote(primary_key)}) "
+    )
+    if not updates:
+        merge += "DO NOTHING"
+    else:
+        merge += f"DO UPDATE SET {updates}"
+        if ROW_HASH_COLUMN in columns:
+            hash_column = _quote(ROW_HASH_COLUMN)
+            merge += f" WHERE {target}.{hash_column} IS DISTINCT FROM EXCLUDED.{hash_column}"
+    return conn.execute(text(merge)).rowcount
+
+
+def _copy_streams(engine, staging, chunks, streams, metrics):
+    """
+    Bulk loads chunks into `staging` with COPY over `streams` pooled
+    connections at once; each COPY is committed on its own. Chunks are
+    serialized here while earlier ones are sent, with at most two per stream
+    in flight.
+
+    Returns:
+        tuple: The first chunk (None if there were none) and the number of rows loaded.
+    """
+    local = threading.local()
+    connections = []
+
+    def send(buffer, columns):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = engine.raw_connection()
+            connections.append(conn)
+        try:
+            with conn.cursor() as cursor:
+                _copy_buffer(cursor, _quote(staging), columns, buffer)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    first, rows, pending = None, 0, deque()
+    try:
+        with ThreadPoolExecutor(max_workers=streams, thread_name_prefix="copy") as executor:
+            for chunk in chunks:
+                with metrics.stage("load") as stage:
+                    if first is None:
+                        first = chunk
+                        with engine.begin() as conn:
+                            chunk.head(0).to_sql(staging, conn, index=False, dtype=_sql_dtypes(chunk))
+                    buffer = io.StringIO()
+                    chunk.to_csv(buffer, index=False, header=False)
+                    pending.append(executor.submit(send, buffer, [str(column) for column in chunk.columns]))
+                    while len(pending) >= 2 * streams or pending and pending[0].done():
+                        pending.popleft().result()
+                    stage["rows"] = len(chunk)
+                rows += len(chunk)
+            with metrics.stage("load"):
+                while pending:
+                    pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        for conn in connections:
+            conn.close()  # Returns it to the pool
+    return first, rows
+
+
+def _swap_in(engine, staging, table_name, primary_key, unique, metrics):
+    """
+    Creates the primary key and unique indexes on the loaded staging table,
+    then replaces `table_name` with it in one transaction, so readers see
+    either the old or the new table.
+    """
+    target = _quote(table_name)
+    renames = []
+    with metrics.stage("index"):
+        with engine.begin() as conn:
+            if primary_key:
+                conn.execute(text(
+                    f"ALTER TABLE {_quote(staging)} ADD CONSTRAINT {_quote(f'{staging}_pkey')} "
+                    f"PRIMARY KEY ({_quote(primary_key)})"
+                ))
+                renames.append((f"{staging}_pkey", f"{table_name}_pkey"))
+            for column in unique:
+                if column == primary_key:
+                    continue
+                index = f"{staging}_{column}_key"
+                conn.execute(text(f"CREATE UNIQUE INDEX {_quote(index)} ON {_quote(staging)} ({_quote(column)})"))
+                renames.append((index, f"{table_name}_{column}_key"))
+            conn.execute(text(f"ANALYZE {_quote(staging)}"))
+    with metrics.stage("swap"):
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {target}"))
+            conn.execute(text(f"ALTER TABLE {_quote(staging)} RENAME TO {target}"))
+            for old, new in renames:
+                conn.execute(text(f"ALTER INDEX {_quote(old)} RENAME TO {_quote(new[:MAX_IDENTIFIER_LENGTH])}"))
+
+
+def _replace_with_streams(engine, chunks, table_name, primary_key, unique, streams, metrics):
+    """
+    "replace" load into PostgreSQL: COPY into a staging table over parallel
+    streams, create the indexes once the rows are in, then swap the staging
+    table in. The staging table is dropped if anything fails.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    staging = f"{table_name[:MAX_IDENTIFIER_LENGTH - 20]}_load_{uuid.uuid4().hex[:8]}"
+    try:
+        first, rows = _copy_streams(engine, staging, chunks, streams, metrics)
+        if first is None:
+            return 0
+        _swap_in(engine, staging, table_name, primary_key, unique, metrics)
+        return rows
+    except Exception:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {_quote(staging)}"))
+        raise
+
+
+def _load_in_transaction(engine, chunks, table_name, mode, primary_key, skip_unchanged, metrics):
+    """
+    Writes all chunks in a single transaction, either replacing the table with
+    INSERT statements (`to_sql`) or merging them with `_upsert_chunk`.
+
+    Returns:
+        tuple: Number of rows loaded and, in "upsert" mode, of rows inserted or updated.
+    """
+    stage_name = f"{table_name}_stage"
+    rows = changed = 0
+    with engine.begin() as conn:
+        for chunk_number, chunk in enumerate(chunks):
+            with metrics.stage("load") as stage:
+                if mode == "upsert":
+                    if skip_unchanged:
+                        chunk = chunk.assign(**{ROW_HASH_COLUMN: _row_hashes(chunk)})
+                    if chunk_number == 0:
+                        _prepare_upsert(conn, chunk, table_name, primary_key, stage_name)
+                    changed += _upsert_chunk(conn, chunk, table_name, primary_key, stage_name)
+                else:
+                    chunk.to_sql(
+                        table_name,
+                        conn,
+                        if_exists="replace" if chunk_number == 0 else "append",
+                        index=False,
+                        dtype=_sql_dtypes(chunk) if chunk_number == 0 else None,
+                    )
+                stage["rows"] = len(chunk)
+            rows += len(chunk)
+    return rows, changed
+
+
+def load_data_to_postgres(data, table_name, connection_uri, method="copy", mode="replace",
+                          primary_key=None, skip_unchanged=True, metrics=None, unique=None, streams=1):
     """
     Loads the transformed data into PostgreSQL.
 
+    In "replace" mode the table is replaced. With COPY, chunks are loaded into
+    a staging table over `streams` connections in parallel, the primary key and
+    unique indexes are only built once all rows are in, and the staging table
+    then replaces the table in one short transaction (drop and rename). In
+    "upsert" mode rows are staged in a temporary table and merged with
+    `INSERT ... ON CONFLICT DO UPDATE` on the primary key, so only new and
+    changed rows are written; with `skip_unchanged` a per-row content hash is
+    stored in `_row_hash` and rows whose hash did not change are not rewritten.
+    Either way a failure part-way through a chunked load leaves the previous
+    table untouched. Connections come from the pooled engine of the destination
+    (see `app.db.get_engine`), so repeated loads reuse them.
+
     Args:
-        df (pd.DataFrame): Transformed DataFrame.
+        data (pd.DataFrame or iterable): Transformed DataFrame, or an iterator of
+            transformed chunks as returned by `transform_data(..., chunksize=...)`.
         table_name (str): Target PostgreSQL table name.
         connection_uri (str): PostgreSQL connection URI.
+        method (str): "copy" to bulk load through COPY FROM STDIN, or "insert" to
+            use plain INSERT statements. Databases other than PostgreSQL always
+            use "insert". Only used in "replace" mode.
+        mode (str): "replace" or "upsert".
+        primary_key (str, optional): Target column the upsert is keyed on,
+            see `get_primary_key`. Required in "upsert" mode.
+        skip_unchanged (bool): In "upsert" mode, skip rows whose content hash is unchanged.
+        metrics (RunMetrics, optional): Receives the "load" stage timing (and
+            "index" and "swap" for parallel replace loads). Time spent
+            producing chunks (e.g. by a streaming `transform_data`) is excluded.
+        unique (list, optional): Target columns given a unique index after a
+            COPY "replace" load, see `get_unique_columns`.
+        streams (int): Connections COPYing chunks in parallel in "replace" mode;
+            see `Config.LOAD_STREAMS`. Capped by the destination's pool size.
+
+    Returns:
+        dict: Load statistics with `rows`, `seconds`, `rows_per_sec` and the
+        `table`, plus `streams` for COPY "replace" loads and `changed` (rows
+        inserted or updated) in "upsert" mode.
     """
     try:
-        engine = create_engine(connection_uri)
-        df.to_sql(table_name, engine, if_exists="replace", index=False)
-        logging.info(f"Data loaded into PostgreSQL table '{table_name}'.")
+        engine = get_engine(connection_uri)
+        if mode == "upsert":
+            if not primary_key:
+                raise ValueError("Incremental loads require a primary key column in the schema.")
+            if engine.dialect.name != "postgresql":
+                raise ValueError(f"Incremental loads are not supported by '{engine.dialect.name}'.")
+        elif mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode '{mode}'. Expected one of {', '.join(LOAD_MODES)}.")
+        if method == "copy" and engine.dialect.name != "postgresql":
+            logging.warning(f"COPY is not supported by '{engine.dialect.name}'. Falling back to INSERT.")
+            method = "insert"
+
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        metrics = metrics or RunMetrics()
+        rows = changed = 0
+        start = time.perf_counter()
+        if mode == "replace" and method == "copy":
+            streams = max(1, min(streams, engines.pool_options["pool_size"] + engines.pool_options["max_overflow"]))
+            rows = _replace_with_streams(engine, chunks, table_name, primary_key, unique or [], streams, metrics)
+        else:
+            rows, changed = _load_in_transaction(
+                engine, chunks, table_name, mode, primary_key, skip_unchanged, metrics
+            )
+        elapsed = time.perf_counter() - start
+
+        rows_per_sec = rows / elapsed if elapsed > 0 else float(rows)
+        stats = {"rows": rows, "seconds": elapsed, "rows_per_sec": rows_per_sec, "table": table_name}
+        if mode == "replace" and method == "copy":
+            stats["streams"] = streams
+        if mode == "upsert":
+            stats["changed"] = changed
+            logging.info(f"Upsert into '{table_name}' on '{primary_key}': {changed} of {rows} rows inserted or updated.")
+        logging.info(
+            f"Data loaded into PostgreSQL table '{table_name}': {rows} rows in {elapsed:.2f}s "
+            f"({rows_per_sec:.0f} rows/sec, mode={mode}, method={method}"
+            f"{f', streams={streams}' if 'streams' in stats else ''})."
+        )
+        return stats
     except Exception as e:
         logging.error(f"Error loading data into PostgreSQL: {e}")
         raise
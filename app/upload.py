@@ -0,0 +1,273 @@
+import codecs
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+
+# Byte order marks, longest first so UTF-32 is not mistaken for UTF-16
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+FALLBACK_ENCODING = "cp1252"  # Tried when a file without BOM is not valid UTF-8
+DELIMITERS = ",;\t|"
+
+
+class InvalidUpload(ValueError):
+    """Raised when an uploaded file is not a usable CSV file."""
+
+
+class _DecodeError(InvalidUpload):
+    """Raised by `_decoded_lines` with the file offset of the first byte that does not decode."""
+
+    def __init__(self, encoding, offset, ascii_before):
+        super().__init__(f"The file is not valid {encoding.upper()} (invalid byte at offset {offset}).")
+        self.encoding = encoding
+        self.offset = offset
+        self.ascii_before = ascii_before  # Whether everything before it was plain ASCII
+
+
+def _detect_encoding(head):
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    if b"\x00" in head:
+        raise InvalidUpload("The file contains binary data and is not a CSV file.")
+    return "utf-8"
+
+
+def _sniff_delimiter(sample):
+    """Guesses the delimiter from the first complete lines of the file; single-column files use ","."""
+    sample = sample[: sample.rfind("\n") + 1] or sample
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def _read_blocks(stream, chunk_size):
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            return
+        yield block
+
+
+def _decoded_lines(blocks, encoding):
+    """
+    Decodes blocks incrementally and yields lines with their line endings, as
+    `csv.reader` expects. Raises `_DecodeError` at the first invalid byte.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+    offset = 0  # Bytes handed to the decoder so far
+    ascii_only = True
+
+    def decode(block, final=False):
+        nonlocal offset, ascii_only
+        buffered = len(decoder.getstate()[0])  # Bytes of a character split across blocks
+        try:
+            text = decoder.decode(block, final)
+        except UnicodeDecodeError as e:
+            raise _DecodeError(
+                encoding, offset - buffered + e.start, ascii_only and e.object[:e.start].isascii()
+            ) from e
+        offset += len(block)
+        ascii_only = ascii_only and text.isascii()
+        return text
+
+    pending = ""
+    for block in blocks:
+        lines = (pending + decode(block)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _metadata_path(path):
+    return f"{path}.upload.json"
+
+
+def load_metadata(path):
+    """Returns the metadata recorded by `receive_upload` for a stored file, or None."""
+    try:
+        with open(_metadata_path(path), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def content_hash(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 of a stored file. Taken from the metadata `receive_upload`
+    recorded when the file has not changed since, else computed by reading it.
+    """
+    metadata = load_metadata(path)
+    stat = os.stat(path)
+    if (
+        metadata is not None
+        and metadata.get("stored_bytes") == stat.st_size
+        and os.path.getmtime(_metadata_path(path)) >= stat.st_mtime
+    ):
+        return metadata["sha256"]
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in _read_blocks(f, chunk_size):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _process(stream, target, chunk_size, sniff_bytes, encoding=None):
+    """One pass over the upload: hashes, decodes, parses and writes it. Returns the metadata."""
+    head = stream.read(max(chunk_size, sniff_bytes))
+    if not head:
+        raise InvalidUpload("The file is empty.")
+    encoding = encoding or _detect_encoding(head)
+    # Only used to guess the delimiter; invalid bytes are reported by the full pass below
+    sample = codecs.getincrementaldecoder(encoding)(errors="replace").decode(head[:sniff_bytes])
+    delimiter = _sniff_delimiter(sample)
+    # UTF-8 comma-separated files are stored as uploaded; anything else is
+    # rewritten as UTF-8 with commas, which is what every later stage reads
+    passthrough = encoding in ("utf-8", "utf-8-sig") and delimiter == ","
+
+    sha256 = hashlib.sha256()
+    size = 0
+
+    def hashed(blocks):
+        nonlocal size
+        for block in blocks:
+            sha256.update(block)
+            size += len(block)
+            if passthrough:
+                out.write(block)
+            yield block
+
+    def chained():
+        yield head
+        yield from _read_blocks(stream, chunk_size)
+
+    header, rows, records, short_rows = None, 0, 0, []
+    with open(target, "wb") as out:
+        text_out = None if passthrough else io.TextIOWrapper(out, encoding="utf-8", newline="")
+        writer = None if passthrough else csv.writer(text_out, lineterminator="\n")
+        reader = csv.reader(_decoded_lines(hashed(chained()), encoding), delimiter=delimiter)
+        for row in reader:
+            records += 1
+            if not row:
+                continue  # Blank line
+            if header is None:
+                header = row
+                if not any(name.strip() for name in header):
+                    raise InvalidUpload("The first line of the file is not a header.")
+            else:
+                rows += 1
+                if len(row) > len(header):
+                    raise InvalidUpload(
+                        f"Line {reader.line_num} has {len(row)} fields but the header has {len(header)}."
+                    )
+                if len(row) < len(header) and len(short_rows) < 10:
+                    short_rows.append(reader.line_num)
+            if writer is not None:
+                writer.writerow(row)
+        if text_out is not None:
+            text_out.flush()
+            text_out.detach()
+
+    if header is None:
+        raise InvalidUpload("The file is empty.")
+    if rows == 0:
+        raise InvalidUpload("The file has a header but no data rows.")
+    return {
+        "sha256": sha256.hexdigest(),
+        "bytes": size,
+        "rows": rows,
+        "columns": len(header),
+        "delimiter": delimiter,
+        "encoding": encoding,
+        "short_rows": short_rows,
+        # Quoted values with line breaks; such files cannot be split at arbitrary lines
+        "multiline_records": reader.line_num != records,
+        "stored_bytes": os.path.getsize(target),
+    }
+
+
+def receive_upload(stream, path, chunk_size=1024 * 1024, sniff_bytes=64 * 1024):
+    """
+    Streams an uploaded CSV file to `path` and validates it on the way.
+
+    The upload is read once, in blocks of `chunk_size` bytes, so memory use does
+    not depend on the file size. While reading, it hashes the content (SHA-256),
+    detects the encoding (byte order mark, else UTF-8, else cp1252 if the
+    file has no valid UTF-8 character before its first invalid byte) and the
+    delimiter, counts the rows and checks that no row has more fields than the
+    header. Rows with fewer fields are allowed (they are padded with missing
+    values when read) and reported. Files that are not UTF-8 or not
+    comma-separated are stored as UTF-8 with commas.
+
+    If `path` already holds a file with the same content it is left untouched,
+    so caches keyed on the stored file (e.g. its Parquet copy) stay valid.
+
+    Args:
+        stream: Binary file object of the upload, e.g. `FileStorage.stream`.
+        path (str): Where to store the file.
+        chunk_size (int): Bytes read at a time.
+        sniff_bytes (int): Bytes used to detect the delimiter.
+
+    Returns:
+        dict: `sha256`, `bytes`, `rows`, `columns`, `delimiter`, `encoding`,
+        `short_rows` (line numbers of the first rows with missing fields),
+        `multiline_records` (whether a quoted value spans lines),
+        `invalid_utf8_offset` (offset of the first byte that made it fall
+        back to cp1252, or None), `stored_bytes` and `duplicate` (True if the
+        same content was already stored at `path`).
+
+    Raises:
+        InvalidUpload: The file is empty, binary, in an unsupported encoding
+            (including UTF-8 with an invalid byte after valid non-ASCII
+            characters, which cp1252 would silently garble) or has rows wider
+            than its header. Nothing is stored in that case.
+    """
+    tmp_path = f"{path}.{os.getpid()}.part"
+    start = stream.tell() if stream.seekable() else None
+    try:
+        try:
+            info = _process(stream, tmp_path, chunk_size, sniff_bytes)
+            info["invalid_utf8_offset"] = None
+        except _DecodeError as e:
+            # Only a file without any valid UTF-8 character so far is taken for
+            # the legacy encoding; otherwise it is UTF-8 with a corrupt byte
+            if e.encoding != "utf-8" or not e.ascii_before or start is None:
+                raise InvalidUpload(f"{e} Please save it as UTF-8.")
+            stream.seek(start)
+            try:
+                info = _process(stream, tmp_path, chunk_size, sniff_bytes, encoding=FALLBACK_ENCODING)
+            except _DecodeError:
+                raise InvalidUpload(f"{e} The file encoding is not supported; please save it as UTF-8.")
+            info["invalid_utf8_offset"] = e.offset
+        except csv.Error as e:
+            raise InvalidUpload(f"The file could not be parsed as CSV: {e}")
+
+        previous = load_metadata(path)
+        info["duplicate"] = bool(
+            previous and previous.get("sha256") == info["sha256"] and os.path.exists(path)
+        )
+        if not info["duplicate"]:
+            os.replace(tmp_path, path)
+            with open(_metadata_path(path), "w") as f:
+                json.dump({key: value for key, value in info.items() if key != "duplicate"}, f, indent=4)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logging.getLogger(__name__).info(
+        f"Received {path}: {info['rows']} rows, {info['columns']} columns, delimiter {info['delimiter']!r}, "
+        f"encoding {info['encoding']}, sha256 {info['sha256'][:12]}{' (unchanged)' if info['duplicate'] else ''}."
+    )
+    return info
@@ -0,0 +1,60 @@
+import logging
+import os
+
+ROW_COLUMN = "_row"  # 1-based position of the row among the data rows of the source file
+REASONS_COLUMN = "_reasons"
+
+
+class Quarantine:
+    """
+    Collects rows that failed validation instead of loading them.
+
+    Rows are appended to a CSV file as they arrive, with the row number in the
+    source file and the reasons they failed, so a long run never holds them in
+    memory. Without a `path` the rows are only counted.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str, optional): CSV file the rows are written to. Created on
+                the first rejected row; an existing file is replaced.
+        """
+        self.path = path
+        self.rows = 0
+        self.reasons = {}  # Reason -> number of rows failing it
+        self._started = False
+
+    def add(self, rows, reasons):
+        """
+        Records rejected rows.
+
+        Args:
+            rows (pd.DataFrame): The rows, indexed by their 0-based position in the source file.
+            reasons (pd.Series): "; "-separated reasons per row, aligned with `rows`.
+        """
+        if rows.empty:
+            return
+        self.rows += len(rows)
+        for reason, count in reasons.str.split("; ").explode().value_counts().items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + int(count)
+        if self.path is None:
+            return
+        output = rows.copy()
+        output.insert(0, REASONS_COLUMN, reasons)
+        output.insert(0, ROW_COLUMN, rows.index + 1)
+        if not self._started:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        output.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def report(self):
+        """Returns the number of quarantined rows, their count per reason and the file holding them."""
+        return {"rows": self.rows, "reasons": self.reasons, "path": self.path if self._started else None}
+
+    def log_summary(self, source):
+        if self.rows:
+            logging.warning(
+                f"Quarantined {self.rows} rows of {source}"
+                f"{f' to {self.path}' if self._started else ''}: {self.reasons}"
+            )
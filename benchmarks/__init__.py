@@ -0,0 +1 @@
+"""Benchmarks of the ETL pipeline; see `benchmarks.run`."""
@@ -0,0 +1,90 @@
+"""
+Compares two results files written by `benchmarks.run`, e.g. before and after a change.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/<before>.json benchmarks/results/<after>.json
+
+Exits with status 1 when a stage got slower, or grew its memory, by more than
+`--threshold` (10% by default), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+
+def _change(before, after):
+    if not before:
+        return None
+    return after / before - 1
+
+
+def compare(before, after, threshold=0.1, min_seconds=0.05):
+    """
+    Lines up the stages of two results documents.
+
+    Args:
+        before (dict): Baseline results.
+        after (dict): Results to check.
+        threshold (float): Relative growth of time or memory counted as a regression.
+        min_seconds (float): Stages faster than this in both runs are not
+            flagged for time, as their timings are mostly noise.
+
+    Returns:
+        list: One dict per stage present in both documents, with the time and
+        memory of each run, their relative change and `regression`.
+    """
+    rows = []
+    for name, old in before["stages"].items():
+        new = after["stages"].get(name)
+        if new is None:
+            continue
+        time_change = _change(old["seconds"], new["seconds"])
+        memory_change = _change(old["memory_bytes"], new["memory_bytes"])
+        timed = max(old["seconds"], new["seconds"]) >= min_seconds
+        rows.append({
+            "stage": name,
+            "seconds": (old["seconds"], new["seconds"]),
+            "time_change": time_change,
+            "memory_bytes": (old["memory_bytes"], new["memory_bytes"]),
+            "memory_change": memory_change,
+            "regression": bool(
+                (timed and time_change is not None and time_change > threshold)
+                or (memory_change is not None and memory_change > threshold)
+            ),
+        })
+    return rows
+
+
+def _percent(change):
+    return "n/a" if change is None else f"{change:+.1%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before["params"] != after["params"]:
+        print("Warning: the runs used different parameters; timings are not directly comparable.")
+    if before["machine"] != after["machine"]:
+        print("Warning: the runs were made on different machines or package versions.")
+
+    rows = compare(before, after, args.threshold)
+    print(f"{'stage':>20} {'before (s)':>11} {'after (s)':>10} {'time':>8} {'memory':>8}")
+    for row in rows:
+        print(
+            f"{row['stage']:>20} {row['seconds'][0]:>11.3f} {row['seconds'][1]:>10.3f} "
+            f"{_percent(row['time_change']):>8} {_percent(row['memory_change']):>8}"
+            f"{'  REGRESSION' if row['regression'] else ''}"
+        )
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
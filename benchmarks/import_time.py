@@ -0,0 +1,78 @@
+"""
+Measures the cold start of the dashboard and of the CLI.
+
+Usage:
+    python -m benchmarks.import_time --repeat 5 --budget 1.0
+
+Each entry point is imported in a fresh interpreter, so nothing is cached in
+the process, and the fastest of `--repeat` runs is reported with the heavy
+libraries the import pulled in. Exits with status 1 when an entry point takes
+longer than `--budget` seconds or imports one of the libraries that are meant
+to be loaded on first use (pandas, NumPy, pyarrow, SQLAlchemy, OpenAI), so it
+can gate CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ENTRY_POINTS = {
+    "web": "app.dashboard",
+    "cli": "app.cli",
+}
+LAZY_MODULES = ("pandas", "numpy", "pyarrow", "sqlalchemy", "openai")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module, repeat=5):
+    """
+    Imports `module` in `repeat` fresh interpreters.
+
+    Returns:
+        dict: The fastest import in `seconds` and the lazily imported libraries it `loaded`.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:  # The dashboard creates its etl_info folder in the working directory
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+                cwd=tmp, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {"seconds": min(run["seconds"] for run in runs), "loaded": runs[0]["loaded"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Imports per entry point; the fastest is reported.")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds an entry point may take to import.")
+    parser.add_argument("--entry-points", nargs="+", choices=ENTRY_POINTS, default=list(ENTRY_POINTS))
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'entry point':>12} {'module':>14} {'import (s)':>11}  eagerly loaded")
+    for name in args.entry_points:
+        result = measure(ENTRY_POINTS[name], args.repeat)
+        over = result["seconds"] > args.budget or result["loaded"]
+        failed = failed or bool(over)
+        print(
+            f"{name:>12} {ENTRY_POINTS[name]:>14} {result['seconds']:>11.3f}  "
+            f"{', '.join(result['loaded']) or '-'}{'  <- over budget' if over else ''}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
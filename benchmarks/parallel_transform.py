@@ -0,0 +1,96 @@
+"""
+Compares the serial and the parallel `transform_data` paths on a synthetic CSV.
+
+Usage:
+    python -m benchmarks.parallel_transform --rows 2000000 --workers 2 4 8
+
+Each configuration is run after a warm-up run, so process start-up is not
+counted, and the parallel output is checked against the serial one.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SCHEMA = {
+    "id": {"name": "id", "type": "integer", "primary_key": True},
+    "quantity": {"name": "quantity", "type": "integer"},
+    "price": {"name": "price", "type": "float"},
+    "city": {"name": "city", "type": "string", "constraints": {"required": True}},
+    "email": {"name": "email", "type": "string", "constraints": {"unique": True}},
+    "ordered_at": {"name": "ordered_at", "type": "date", "format": "%Y-%m-%d %H:%M:%S"},
+    "note": {"name": "note", "type": "string"},
+}
+
+
+def write_csv(path, rows, seed=0):
+    """Writes a CSV matching `SCHEMA` with some missing values, in blocks of 500k rows."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, 500000):
+        n = min(500000, rows - start)
+        ids = np.arange(start, start + n)
+        block = pd.DataFrame({
+            "id": ids,
+            "quantity": np.where(rng.random(n) < 0.05, np.nan, rng.integers(0, 1000, n)),
+            "price": rng.random(n).round(2) * 100,
+            "city": rng.choice(["Berlin", "Paris", "Rome", "Madrid", None], n),
+            "email": [f"user{i}@example.com" for i in ids],
+            "ordered_at": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 3e7, n), unit="s"),
+            "note": rng.choice(["", "gift", "express delivery", "call before"], n),
+        })
+        block.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument("--csv", help="Use this CSV file (with the `SCHEMA` columns) instead of generating one.")
+    args = parser.parse_args()
+
+    from app.transform import transform_data
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv or os.path.join(tmp, "orders.csv")
+        if not args.csv:
+            write_csv(path, args.rows)
+        print(f"{path}: {os.path.getsize(path) / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+
+        def whole(workers):
+            return lambda: transform_data(path, SCHEMA, workers=workers)
+
+        def chunked(workers):
+            return lambda: sum(len(chunk) for chunk in transform_data(
+                path, SCHEMA, chunksize=args.chunksize, workers=workers
+            ))
+
+        expected, serial = timed(whole(1))
+        rows, serial_chunked = timed(chunked(1))
+        print(f"{'workers':>8} {'whole (s)':>10} {'speedup':>8} {'chunked (s)':>12} {'speedup':>8}")
+        print(f"{1:>8} {serial:>10.2f} {1:>8.2f} {serial_chunked:>12.2f} {1:>8.2f}")
+        for workers in args.workers:
+            transform_data(path, SCHEMA, workers=workers)  # Warm-up: starts the worker processes
+            result, seconds = timed(whole(workers))
+            pd.testing.assert_frame_equal(result, expected)
+            chunked_rows, chunked_seconds = timed(chunked(workers))
+            assert chunked_rows == rows
+            print(
+                f"{workers:>8} {seconds:>10.2f} {serial / seconds:>8.2f} "
+                f"{chunked_seconds:>12.2f} {serial_chunked / chunked_seconds:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Synthetic CSV files, with the schema mapping the pipeline would get for them.
+"""
+import numpy as np
+import pandas as pd
+
+TYPES = ("integer", "float", "string", "date")
+DEFAULT_TYPE_MIX = {"integer": 3, "float": 2, "string": 4, "date": 1}
+DATE_FORMAT = "%Y-%m-%d"
+_WORDS = np.array([
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett",
+    "kilo", "lima", "mike", "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango",
+])
+
+
+def parse_type_mix(text):
+    """Parses a type mix such as "integer=3,float=2,string=4,date=1" into weights."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in TYPES:
+            raise ValueError(f"Unknown column type '{name}'. Expected one of {TYPES}.")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def column_types(width, type_mix=None):
+    """
+    Spreads `width` columns over the types of `type_mix` in proportion to their
+    weights; the first column is always the integer `id`.
+    """
+    mix = type_mix or DEFAULT_TYPE_MIX
+    total = sum(mix.values())
+    types = ["integer"]
+    for name, weight in mix.items():
+        types += [name] * int(round((width - 1) * weight / total))
+    types = (types + [max(mix, key=mix.get)] * width)[:width]
+    return [("id" if i == 0 else f"{dtype}_{i}", dtype) for i, dtype in enumerate(types)]
+
+
+def schema_for(columns, duplicate_rate=0.0):
+    """
+    Schema mapping of a generated file: every column keeps its name and type,
+    `id` is unique (and the primary key when it has no duplicates), and every
+    other string column is required.
+    """
+    schema = {}
+    for i, (name, dtype) in enumerate(columns):
+        target = {"name": name, "type": dtype}
+        if dtype == "date":
+            target["format"] = DATE_FORMAT
+        if name == "id":
+            target["constraints"] = {"required": True, "unique": True}
+            target["primary_key"] = duplicate_rate == 0
+        elif dtype == "string" and i % 2 == 0:
+            target["constraints"] = {"required": True}
+        schema[name] = target
+    return schema
+
+
+def _column(rng, dtype, index, ids):
+    n = len(ids)
+    if dtype == "integer":
+        return rng.integers(-1000, 1000, n) if index % 2 else rng.integers(0, 2**40, n)
+    if dtype == "float":
+        return (rng.random(n) * 1000).round(3)
+    if dtype == "string":
+        if index % 2:
+            return rng.choice(_WORDS, n)  # Low cardinality: becomes a categorical
+        return pd.Series(rng.choice(_WORDS, n)).str.cat(ids.astype(str), sep="-").to_numpy()
+    days = rng.integers(0, 20000, n).astype("timedelta64[D]")
+    return pd.Series(np.datetime64("1970-01-01") + days).dt.strftime(DATE_FORMAT).to_numpy()
+
+
+def generate_csv(path, rows, width=10, type_mix=None, null_rate=0.05, duplicate_rate=0.0, seed=0,
+                 block_rows=200000):
+    """
+    Writes a synthetic CSV file in blocks, so memory does not grow with `rows`.
+
+    Args:
+        path (str): File to write.
+        rows (int): Number of data rows.
+        width (int): Number of columns, including `id`.
+        type_mix (dict, optional): Relative weights of "integer", "float",
+            "string" and "date" columns, see `parse_type_mix`.
+        null_rate (float): Share of missing values in every column except `id`.
+        duplicate_rate (float): Share of rows whose `id` repeats an earlier one.
+        seed (int): Random seed; the same arguments always give the same file.
+        block_rows (int): Rows generated and written at a time.
+
+    Returns:
+        dict: Schema mapping for the file, see `schema_for`.
+    """
+    rng = np.random.default_rng(seed)
+    columns = column_types(width, type_mix)
+    for start in range(0, rows, block_rows):
+        n = min(block_rows, rows - start)
+        ids = np.arange(start, start + n)
+        duplicates = rng.random(n) < duplicate_rate
+        # A duplicate repeats the id of a random earlier row
+        positions = start + np.flatnonzero(duplicates)
+        ids[duplicates] = (rng.random(len(positions)) * positions).astype(np.int64)
+        data = {"id": ids}
+        for index, (name, dtype) in enumerate(columns[1:], start=1):
+            values = pd.Series(_column(rng, dtype, index, ids))
+            if dtype == "integer":
+                values = values.astype("Int64")  # Written without ".0" once values are missing
+            data[name] = values.mask(rng.random(n) < null_rate)
+        pd.DataFrame(data).to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return schema_for(columns, duplicate_rate)
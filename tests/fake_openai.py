@@ -0,0 +1,106 @@
+"""
+A local OpenAI-compatible chat completions server for tests.
+
+It answers `POST /v1/chat/completions` with a schema mapping for the columns
+listed in the schema inference prompt (see `app.llm_utils.build_schema_prompt`),
+so batch inference runs end to end through a real `AsyncOpenAI` client without
+network access.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PROMPT_COLUMN = re.compile(r'^    ("(?:[^"\\]|\\.)*"): \{', re.MULTILINE)
+
+
+class FakeOpenAI:
+    """
+    Runs the server on a free local port; use as a context manager.
+
+    Args:
+        primary_keys (tuple): Columns every reply marks as primary key.
+        failures (list): HTTP status codes returned, in order, by the first requests
+            (e.g. [429, 500]) before requests are answered normally.
+        delay (float): Seconds each request takes, so overlapping requests can be counted.
+    """
+
+    def __init__(self, primary_keys=(), failures=(), delay=0.0):
+        self.primary_keys = set(primary_keys)
+        self.failures = list(failures)
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def reply(self, prompt):
+        """Schema mapping for the columns of one prompt: lower case string columns."""
+        columns = [json.loads(match) for match in _PROMPT_COLUMN.findall(prompt)]
+        return {
+            column: {"name": column.lower(), "type": "string", "primary_key": column in self.primary_keys}
+            for column in columns
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    status = fake.failures.pop(0) if fake.failures else 200
+                try:
+                    time.sleep(fake.delay)
+                    if status != 200:
+                        self._send(status, {"error": {"message": f"Fake error {status}", "type": "fake", "code": None}})
+                        return
+                    prompt = body["messages"][-1]["content"]
+                    with fake._lock:
+                        fake.prompts.append(prompt)
+                    self._send(200, {
+                        "id": f"chatcmpl-{fake.requests}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": json.dumps(fake.reply(prompt))},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
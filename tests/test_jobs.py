@@ -0,0 +1,39 @@
+from app.jobs import FAILED, JobManager, JobStore, _fernet
+
+
+def test_credentials_are_stored_encrypted_and_cleared(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), max_workers=1, secret_key="key")
+    try:
+        job_id = manager.submit(
+            "infer_schema", csv_file_path=str(tmp_path / "missing.csv"), api_key="sk-secret", model="m",
+            sample_rows=5, local_types=True, cache_config={"cache_dir": str(tmp_path / "cache")},
+        )
+        token = manager.store.get_secrets(job_id)
+        assert token is not None and "sk-secret" not in token
+        assert manager._decrypt(token) == {"api_key": "sk-secret"}
+        manager.futures[job_id].exception(timeout=120)
+    finally:
+        manager.shutdown()
+
+    assert manager.store.get(job_id)["status"] == FAILED
+    assert manager.store.get_secrets(job_id) is None
+    assert (tmp_path / "jobs.sqlite3").read_bytes().find(b"sk-secret") == -1
+
+
+def test_resume_restores_credentials_and_fails_with_another_key(tmp_path):
+    db_path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(db_path)
+    args = {"csv_file_path": str(tmp_path / "missing.csv"), "model": "m", "sample_rows": 5, "local_types": True,
+            "cache_config": {"cache_dir": str(tmp_path / "cache")}}
+    resumable, orphaned = store.create("infer_schema", args), store.create("infer_schema", args)
+
+    store.update(resumable, secrets=_fernet("key").encrypt(b'{"api_key": "sk-secret"}').decode("ascii"))
+    store.update(orphaned, secrets=_fernet("old key").encrypt(b'{"api_key": "sk-secret"}').decode("ascii"))
+
+    manager = JobManager(db_path, max_workers=1, secret_key="key")
+    try:
+        assert resumable in manager.futures
+        assert manager.store.get(orphaned)["status"] == FAILED
+        assert "could not be recovered" in manager.store.get(orphaned)["error"]
+    finally:
+        manager.shutdown()
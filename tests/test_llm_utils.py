@@ -0,0 +1,72 @@
+import pytest
+from openai import AsyncOpenAI
+
+from app.llm_utils import infer_schemas_batch
+from tests.fake_openai import FakeOpenAI
+
+
+def _write_csv(path, columns, rows=3):
+    lines = [",".join(columns)] + [",".join(f"{column}{row}" for column in columns) for row in range(rows)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def _client(server):
+    # The SDK's own retries are disabled so that only infer_schemas_async retries
+    return AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+
+
+def test_requests_run_concurrently_up_to_the_limit(tmp_path):
+    paths = [_write_csv(tmp_path / f"file{i}.csv", ["a", "b"]) for i in range(6)]
+    with FakeOpenAI(delay=0.2) as server:
+        schemas, errors = infer_schemas_batch(
+            paths, _client(server), "fake-model", max_concurrency=2, local_types=False
+        )
+
+    assert errors == {}
+    assert set(schemas) == set(paths)
+    assert server.requests == 6
+    assert server.max_in_flight == 2
+
+
+@pytest.mark.parametrize("failures", [[429], [500], [429, 500]])
+def test_failed_requests_are_retried(tmp_path, failures):
+    path = _write_csv(tmp_path / "data.csv", ["a", "b"])
+    with FakeOpenAI(failures=failures) as server:
+        schemas, errors = infer_schemas_batch(
+            [path], _client(server), "fake-model", backoff=0.01, local_types=False
+        )
+
+    assert errors == {}
+    assert schemas[path] == {
+        "a": {"name": "a", "type": "string", "primary_key": False},
+        "b": {"name": "b", "type": "string", "primary_key": False},
+    }
+    assert server.requests == len(failures) + 1
+
+
+def test_requests_fail_after_the_last_retry(tmp_path):
+    path = _write_csv(tmp_path / "data.csv", ["a"])
+    with FakeOpenAI(failures=[500, 500, 500]) as server:
+        schemas, errors = infer_schemas_batch(
+            [path], _client(server), "fake-model", max_retries=2, backoff=0.01, local_types=False
+        )
+
+    assert schemas == {}
+    assert path in errors
+    assert server.requests == 3
+
+
+def test_one_primary_key_is_kept_across_column_batches(tmp_path):
+    columns = ["order_id", "name", "city", "customer_id", "email"]
+    path = _write_csv(tmp_path / "orders.csv", columns)
+    with FakeOpenAI(primary_keys={"order_id", "customer_id"}) as server:
+        schemas, errors = infer_schemas_batch(
+            [path], _client(server), "fake-model", columns_per_prompt=2, local_types=False
+        )
+
+    assert errors == {}
+    assert server.requests == 3  # The columns are sent in batches of two
+    schema = schemas[path]
+    assert list(schema) == columns
+    assert [column for column, target in schema.items() if target["primary_key"]] == ["order_id"]
@@ -0,0 +1,91 @@
+import os
+
+from app.log_reader import LogReader
+
+
+def _line(i, level="INFO"):
+    return f"2024-01-01 00:00:{i:02d} - {level} - message {i}\n"
+
+
+def _write(path, lines, mode="a"):
+    with open(path, mode) as f:
+        f.writelines(lines)
+
+
+def _messages(page):
+    return [entry["message"] for entry in page["entries"]]
+
+
+def test_tail_pages_backwards_across_backups(tmp_path):
+    log = str(tmp_path / "app.log")
+    _write(log + ".1", [_line(i) for i in range(5)])
+    _write(log, [_line(5), "Traceback line\n", _line(6, "ERROR")] + [_line(i) for i in range(7, 10)])
+    reader = LogReader(log, backup_count=2, block_size=16)
+
+    page = reader.tail(limit=3)
+    pages = [_messages(page)]
+    while page["before"] is not None:
+        page = reader.tail(limit=3, before=page["before"])
+        pages.insert(0, _messages(page))
+
+    messages = [message for messages in pages for message in messages]
+    assert messages == [f"message {i}" for i in range(5)] + ["message 5\nTraceback line"] + [
+        f"message {i}" for i in range(6, 10)
+    ]
+    assert _messages(reader.tail(level="ERROR")) == ["message 6"]
+
+
+def test_since_pages_forward_without_gaps_or_repeats(tmp_path):
+    log = str(tmp_path / "app.log")
+    _write(log, [_line(i) for i in range(10)])
+    reader = LogReader(log, block_size=16)
+
+    messages, cursor = [], f"{os.stat(log).st_ino}-0"
+    while True:
+        page = reader.since(cursor, limit=3)
+        if not page["entries"]:
+            break
+        messages += _messages(page)
+        cursor = page["after"]
+
+    assert messages == [f"message {i}" for i in range(10)]
+    assert cursor == reader.end_cursor()
+
+
+def test_since_follows_a_rotation(tmp_path):
+    log = str(tmp_path / "app.log")
+    _write(log, [_line(0), _line(1)])
+    reader = LogReader(log, backup_count=2)
+    cursor = reader.end_cursor()
+
+    _write(log, [_line(2)])
+    os.rename(log, log + ".1")
+    _write(log, [_line(3), _line(4)])
+
+    page = reader.since(cursor)
+    assert _messages(page) == ["message 2", "message 3", "message 4"]
+    assert page["after"] == reader.end_cursor()
+
+
+def test_since_restarts_after_truncation(tmp_path):
+    log = str(tmp_path / "app.log")
+    _write(log, [_line(i) for i in range(5)])
+    reader = LogReader(log)
+    cursor = reader.end_cursor()
+
+    reader.clear()
+    _write(log, [_line(7)])
+
+    assert _messages(reader.since(cursor)) == ["message 7"]
+
+
+def test_since_leaves_out_a_line_still_being_written(tmp_path):
+    log = str(tmp_path / "app.log")
+    _write(log, [_line(0), "2024-01-01 00:00:01 - INFO - mess"])
+    reader = LogReader(log)
+
+    page = reader.since(f"{os.stat(log).st_ino}-0")
+    assert _messages(page) == ["message 0"]
+
+    _write(log, ["age 1\n"])
+    assert _messages(reader.since(page["after"])) == ["message 1"]
@@ -0,0 +1,24 @@
+from app.profiling import profile_csv
+
+
+def test_decimal_text_stays_float_and_integers_with_gaps_stay_integer(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("id,price,qty\n1,10.00,3\n2,20.00,\n3,30.00,5\n")
+
+    columns = profile_csv(str(path))["columns"]
+
+    assert columns["price"]["type"] == "float"
+    assert columns["qty"]["type"] == "integer"
+
+
+def test_max_rows_profiles_the_head_and_marks_the_profile_sampled(tmp_path):
+    path = tmp_path / "large.csv"
+    path.write_text("id,name\n" + "".join(f"{i},{'x' if i < 10 else ''}\n" for i in range(1, 101)))
+
+    profile = profile_csv(str(path), chunksize=4, max_rows=9)
+
+    assert profile["rows"] == 9
+    assert profile["sampled"]
+    assert profile["columns"]["name"]["nulls"] == 0
+    assert not profile["columns"]["id"]["distinct_exact"]
+    assert not profile_csv(str(path), max_rows=100)["sampled"]
@@ -0,0 +1,16 @@
+from app.schema_cache import SchemaCache
+
+
+def test_counters_are_shared_and_split_by_kind(tmp_path):
+    writer = SchemaCache(str(tmp_path))
+    writer.set("schema-key", {"a": {"name": "a", "type": "string"}})
+    writer.set("profile-key", {"columns": ["a"]})
+
+    worker = SchemaCache(str(tmp_path))  # Another process, e.g. a job worker
+    assert worker.get("schema-key") is not None
+    assert worker.get("missing") is None
+    assert worker.get("profile-key", kind="profile") is not None
+
+    assert SchemaCache(str(tmp_path)).stats() == {
+        "hits": 1, "misses": 1, "profile_hits": 1, "profile_misses": 0, "entries": 2,
+    }
@@ -0,0 +1,108 @@
+import json
+import sqlite3
+
+from flask import Flask, session
+
+from app.session_store import SessionStore, SQLiteSessionInterface
+
+
+def _stored_data(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return [json.loads(row[0]) for row in conn.execute("SELECT data FROM sessions")]
+
+
+def test_schema_versions_record_diffs_and_skip_identical_saves(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    first = {"id": {"name": "id", "type": "integer"}, "name": {"name": "name", "type": "string"}}
+    second = {"id": {"name": "id", "type": "string"}, "day": {"name": "day", "type": "date"}}
+
+    assert store.save_schema("s1", first, "inferred") == 1
+    assert store.save_schema("s1", first, "edited") == 1
+    assert store.save_schema("s1", second, "edited") == 2
+    assert store.save_schema("s2", second, "file") == 1
+
+    latest = store.get_schema("s1")
+    assert (latest["version"], latest["mapping"], latest["source"]) == (2, second, "edited")
+    assert latest["diff"] == {
+        "added": ["day"],
+        "removed": ["name"],
+        "changed": {"id": {"before": first["id"], "after": second["id"]}},
+    }
+    assert store.get_schema("s1", version=1)["mapping"] == first
+    assert [entry["version"] for entry in store.schema_versions("s1")] == [2, 1]
+    assert store.get_schema("missing") is None
+
+
+def test_only_the_latest_schema_versions_are_kept(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"), max_versions=2)
+
+    for i in range(4):
+        store.save_schema("s1", {"c": {"name": "c", "type": f"t{i}"}}, "edited")
+
+    assert [entry["version"] for entry in store.schema_versions("s1")] == [4, 3]
+    assert store.get_schema("s1", version=2) is None
+
+
+def test_secrets_stay_out_of_the_database(tmp_path):
+    db_path = str(tmp_path / "sessions.sqlite3")
+    store = SessionStore(db_path)
+    values = {"openai_api_key": "sk-secret", "destination_db": {"password": "hunter2"}, "file": "a.csv"}
+
+    store.save("s1", values)
+
+    assert store.load("s1") == values
+    assert _stored_data(db_path) == [{"file": "a.csv"}]
+    # A new process (e.g. after a restart) has the public values only
+    assert SessionStore(db_path).load("s1") == {"file": "a.csv"}
+
+
+def test_secrets_saved_by_earlier_versions_are_removed(tmp_path):
+    db_path = str(tmp_path / "sessions.sqlite3")
+    SessionStore(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO sessions VALUES (?, ?, strftime('%s', 'now'))",
+            ("s1", json.dumps({"openai_api_key": "sk-secret", "file": "a.csv"})),
+        )
+
+    store = SessionStore(db_path)
+
+    assert _stored_data(db_path) == [{"file": "a.csv"}]
+    assert store.load("s1") == {"file": "a.csv"}
+
+
+def test_expired_sessions_are_not_loaded(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"), ttl=0)
+
+    store.save("s1", {"file": "a.csv"})
+
+    assert store.load("s1") is None
+    assert store.purge_expired() == 1
+
+
+def test_session_interface_keeps_values_server_side(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = SQLiteSessionInterface(store)
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session["file"] = value
+        session["openai_api_key"] = "sk-secret"
+        return ""
+
+    @app.route("/get")
+    def get_value():
+        return session.get("file", "")
+
+    client = app.test_client()
+    client.get("/set/" + "x" * 5000)
+    cookie = client.get_cookie("session")
+
+    assert len(cookie.value) < 100
+    assert client.get("/get").text == "x" * 5000
+    assert "sk-secret" not in json.dumps(_stored_data(store.db_path))
+
+    client.set_cookie("session", cookie.value[:-2] + "xx")
+    assert client.get("/get").text == ""
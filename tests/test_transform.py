@@ -0,0 +1,125 @@
+import pandas as pd
+import pytest
+
+from app.transform import transform_data
+from app.validation import Quarantine
+
+SCHEMA = {
+    "id": {"name": "id", "type": "integer", "primary_key": True},
+    "amount": {"name": "amount", "type": "integer"},
+}
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_integer_overflow_is_quarantined(tmp_path, chunksize):
+    path = tmp_path / "overflow.csv"
+    path.write_text("id,amount\n1,10\n2,99999999999999999999\n3,1e20\n4,123456789012\n")
+    quarantine = Quarantine()
+
+    result = transform_data(str(path), SCHEMA, chunksize=chunksize, quarantine=quarantine)
+    if chunksize:
+        result = pd.concat(list(result))
+
+    assert result["id"].tolist() == [1, 4]
+    assert result["amount"].tolist() == [10, 123456789012]
+    assert quarantine.report()["reasons"] == {"invalid integer in amount": 2}
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_suffix_quarantines_duplicates_of_non_string_columns(tmp_path, chunksize):
+    path = tmp_path / "codes.csv"
+    path.write_text("id,code\n1,10\n2,11\n3,10\n4,12\n")
+    schema = {
+        "id": {"name": "id", "type": "integer", "primary_key": True},
+        "code": {"name": "code", "type": "integer", "constraints": {"unique": True, "on_duplicate": "suffix"}},
+    }
+    quarantine = Quarantine()
+
+    result = transform_data(str(path), schema, chunksize=chunksize, quarantine=quarantine)
+    chunks = list(result) if chunksize else [result]
+
+    assert all(pd.api.types.is_integer_dtype(chunk["code"]) for chunk in chunks)
+    result = pd.concat(chunks)
+    assert result["id"].tolist() == [1, 2, 4]
+    assert result["code"].tolist() == [10, 11, 12]
+    assert quarantine.report()["reasons"] == {"duplicate code": 1}
+
+
+@pytest.mark.parametrize("strategy", ["suffix", "drop", "keep_first"])
+def test_duplicate_strategies_do_not_depend_on_chunk_size(tmp_path, strategy):
+    path = tmp_path / "duplicates.csv"
+    path.write_text("id,c\n1,a\n2,b\n3,a\n4,c\n5,b\n")
+    schema = {
+        "id": {"name": "id", "type": "integer", "primary_key": True},
+        "c": {"name": "c", "type": "string", "constraints": {"unique": True, "on_duplicate": strategy}},
+    }
+
+    whole = transform_data(str(path), schema)
+    chunked = pd.concat(list(transform_data(str(path), schema, chunksize=2)))
+
+    assert whole["id"].tolist() == chunked["id"].tolist()
+    assert whole["c"].astype(object).tolist() == chunked["c"].astype(object).tolist()
+    assert whole["c"].astype(object).tolist()[:2] == ["a", "b"]
+
+
+def _keys_csv(path, rows):
+    """Rows whose id and code repeat across chunk boundaries, with some invalid and missing values."""
+    lines = ["id,code,amount,day"]
+    for i in range(rows):
+        key = i - 3 if i % 97 == 0 and i else i  # Duplicate primary keys, rows apart
+        code = f"c{i - 5}" if i % 89 == 0 and i >= 5 else f"c{i}"  # Duplicate codes, rows apart
+        amount = "n/a" if i % 101 == 0 else "" if i % 103 == 0 else f"{i}.5"
+        lines.append(f"{key},{code},{amount},2024-01-{i % 28 + 1:02d}")
+    path.write_text("\n".join(lines) + "\n")
+
+
+KEYS_SCHEMA = {
+    "id": {"name": "id", "type": "integer", "primary_key": True},
+    "code": {"name": "code", "type": "string", "constraints": {"unique": True, "on_duplicate": "keep_first"}},
+    "amount": {"name": "amount", "type": "float", "constraints": {"required": True}},
+    "day": {"name": "day", "type": "date", "format": "%Y-%m-%d"},
+}
+
+
+def _rows(result):
+    df = pd.concat(list(result)) if not isinstance(result, pd.DataFrame) else result
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def test_key_checks_span_chunk_boundaries(tmp_path):
+    path = tmp_path / "keys.csv"
+    path.write_text("id,code\n1,a\n2,b\n3,c\n1,d\n5,b\n6,e\n")
+    schema = {
+        "id": {"name": "id", "type": "integer", "primary_key": True},
+        "code": {"name": "code", "type": "string", "constraints": {"unique": True, "on_duplicate": "keep_first"}},
+    }
+    quarantine = Quarantine()
+
+    result = pd.concat(list(transform_data(str(path), schema, chunksize=2, quarantine=quarantine)))
+
+    assert result["id"].tolist() == [1, 2, 3, 6]
+    assert quarantine.report()["reasons"] == {"duplicate primary key id": 1, "duplicate code": 1}
+
+
+def test_serial_chunked_parallel_and_cached_transforms_agree(tmp_path, monkeypatch):
+    from app.columnar import convert_csv
+    from app.config import Config
+
+    path = tmp_path / "modes.csv"
+    _keys_csv(path, 6000)
+    serial_quarantine = Quarantine()
+    expected = _rows(transform_data(str(path), KEYS_SCHEMA, quarantine=serial_quarantine))
+    assert serial_quarantine.rows > 0
+
+    def run(**kwargs):
+        quarantine = Quarantine()
+        rows = _rows(transform_data(str(path), KEYS_SCHEMA, quarantine=quarantine, **kwargs))
+        return rows, quarantine.report()["reasons"]
+
+    for kwargs in ({"chunksize": 1000}, {"workers": 2}, {"workers": 2, "chunksize": 1000}):
+        assert run(**kwargs) == (expected, serial_quarantine.reasons), kwargs
+
+    monkeypatch.setattr(Config, "UPLOAD_CACHE_FOLDER", str(tmp_path / "cache"))
+    convert_csv(str(path), chunksize=1000)
+    for kwargs in ({}, {"chunksize": 1000}, {"workers": 2}):
+        assert run(**kwargs) == (expected, serial_quarantine.reasons), ("cached", kwargs)
@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+from app.upload import InvalidUpload, receive_upload
+
+
+def test_legacy_encoding_falls_back_to_cp1252(tmp_path):
+    path = tmp_path / "legacy.csv"
+
+    info = receive_upload(io.BytesIO("a,b\n1,caf\xe9\n".encode("cp1252")), str(path), chunk_size=4)
+
+    assert info["encoding"] == "cp1252"
+    assert info["invalid_utf8_offset"] == 9
+    assert path.read_text(encoding="utf-8") == "a,b\n1,caf\xe9\n"
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1024])
+def test_utf8_with_a_stray_byte_is_rejected_with_its_offset(tmp_path, chunk_size):
+    data = "a,b\n1,caf\xe9\n2,x".encode("utf-8") + b"\xff\n"
+
+    with pytest.raises(InvalidUpload, match="offset 15"):
+        receive_upload(io.BytesIO(data), str(tmp_path / "stray.csv"), chunk_size=chunk_size)
+
+    assert not (tmp_path / "stray.csv").exists()
+
+
+def test_semicolon_utf16_file_is_stored_as_utf8_with_commas(tmp_path):
+    path = tmp_path / "export.csv"
+    data = "a;b\n1;caf\xe9\n2;\"x;y\"\n".encode("utf-16")
+
+    info = receive_upload(io.BytesIO(data), str(path), chunk_size=5)
+
+    assert (info["encoding"], info["delimiter"], info["rows"], info["columns"]) == ("utf-16", ";", 2, 2)
+    assert path.read_text(encoding="utf-8") == 'a,b\n1,caf\xe9\n2,x;y\n'
+
+
+def test_utf8_comma_file_is_stored_as_uploaded(tmp_path):
+    path = tmp_path / "plain.csv"
+    data = "﻿a,b\r\n1,2\r\n".encode("utf-8")
+
+    info = receive_upload(io.BytesIO(data), str(path))
+
+    assert info["encoding"] == "utf-8-sig"
+    assert path.read_bytes() == data
+
+
+def test_rows_wider_than_the_header_are_rejected(tmp_path):
+    with pytest.raises(InvalidUpload, match="Line 3 has 3 fields but the header has 2"):
+        receive_upload(io.BytesIO(b"a,b\n1,2\n3,4,5\n"), str(tmp_path / "wide.csv"))
+
+    assert not (tmp_path / "wide.csv").exists()
+
+
+def test_short_rows_are_stored_and_reported(tmp_path):
+    info = receive_upload(io.BytesIO(b"a,b,c\n1,2,3\n4,5\n6\n"), str(tmp_path / "short.csv"))
+
+    assert info["rows"] == 3
+    assert info["short_rows"] == [3, 4]
+
+
+def test_same_content_is_reported_as_duplicate(tmp_path):
+    path = str(tmp_path / "data.csv")
+
+    first = receive_upload(io.BytesIO(b"a,b\n1,2\n"), path)
+    second = receive_upload(io.BytesIO(b"a,b\n1,2\n"), path)
+
+    assert not first["duplicate"]
+    assert second["duplicate"] and second["sha256"] == first["sha256"]
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+from app.transform import transform_data
+from app.validation import Quarantine
+
+SCHEMA = {
+    "id": {"name": "id", "type": "integer", "primary_key": True},
+    "amount": {"name": "amount", "type": "float", "constraints": {"required": True}},
+    "day": {"name": "day", "type": "date", "format": "%Y-%m-%d"},
+}
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_rows_are_quarantined_with_every_reason_they_fail(tmp_path, chunksize):
+    path = tmp_path / "data.csv"
+    path.write_text(
+        "id,amount,day\n"
+        "1,1.5,2024-01-01\n"
+        ",2.5,2024-01-02\n"
+        "3,,2024-13-01\n"
+        "1,x,2024-01-04\n"
+        "5,5.5,2024-01-05\n"
+        "1,6.5,2024-01-06\n"
+    )
+    quarantine = Quarantine(str(tmp_path / "rejected" / "data.csv"))
+
+    result = transform_data(str(path), SCHEMA, chunksize=chunksize, quarantine=quarantine)
+    if chunksize:
+        result = pd.concat(list(result))
+
+    assert result["id"].tolist() == [1, 5]
+    report = quarantine.report()
+    assert report["rows"] == 4
+    assert report["reasons"] == {
+        "missing primary key id": 1,
+        "missing amount": 2,
+        "invalid date in day": 1,
+        "invalid float in amount": 1,
+        "duplicate primary key id": 1,
+    }
+    # Row 4 repeats id 1 but is rejected for its amount alone: only valid rows claim a key
+    rejected = pd.read_csv(report["path"])
+    assert rejected["_row"].tolist() == [2, 3, 4, 6]
+    assert set(rejected.loc[1, "_reasons"].split("; ")) == {"missing amount", "invalid date in day"}
+    assert rejected.loc[2, "amount"] == "x"  # Rows keep their original text
+
+
+def test_quarantine_without_path_only_counts():
+    quarantine = Quarantine()
+
+    quarantine.add(pd.DataFrame({"a": ["x", "y"]}, index=[4, 9]), pd.Series(["bad a", "bad a; bad b"], index=[4, 9]))
+    quarantine.add(pd.DataFrame({"a": []}), pd.Series([], dtype=str))
+
+    assert quarantine.report() == {"rows": 2, "reasons": {"bad a": 2, "bad b": 1}, "path": None}